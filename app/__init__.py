@@ -9,6 +9,17 @@ __all__ = [
     "state",
     "orchestrator",
     "websocket",
+    "mailbox",
+    "facts",
+    "broker",
+    "scheduler",
+    "transport",
+    "speculation",
+    "preemption",
+    "tokens",
+    "packer",
+    "metrics",
+    "log",
     "summarizer",
     "utils",
 ]
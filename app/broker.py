@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import json
+import os
+import sys
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from .config import settings
+from .log import get_logger
+
+
+log = get_logger("broker")
+
+Envelope = Dict[str, Any]
+Handler = Callable[[Envelope], Awaitable[None]]
+
+# Frames can carry long messages; asyncio's default 64 KiB line limit is too small
+_LINE_LIMIT = 16 * 1024 * 1024
+# A relay peer with this much unsent data must catch up within _PEER_DRAIN_SEC or be disconnected
+_PEER_BUFFER_MAX = 2 * _LINE_LIMIT
+_PEER_DRAIN_SEC = 1.0
+
+
+class Broker:
+    """Pub/sub between app workers.
+
+    Every envelope published by any worker is handed to the subscribed handler of every
+    worker exactly once, including the publishing worker itself. Envelopes are plain JSON
+    dicts: {"kind": ..., "room_id": ..., "data": ..., "origin": <worker id>}.
+
+    This base class is the in-process backend: delivery is a direct call, so a single
+    worker pays nothing for the abstraction.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._handler: Optional[Handler] = None
+
+    def subscribe(self, handler: Handler):
+        self._handler = handler
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, envelope: Envelope):
+        envelope.setdefault("origin", self.worker_id)
+        if self._handler is not None:
+            await self._handler(envelope)
+
+
+InProcessBroker = Broker
+
+
+class UnixSocketBroker(Broker):
+    """Shares envelopes between workers on one machine through a tiny Unix-socket daemon.
+
+    Stands in for Redis pub/sub: each worker keeps one connection to the daemon, which
+    relays every line to all other connections. Local delivery does not wait for the round
+    trip. With `autostart`, the first worker to find no daemon hosts one in-process
+    (guarded by a file lock so concurrent workers agree on a single host); if the hosting
+    worker dies, the others reconnect and one of them takes over.
+    """
+
+    def __init__(self, path: str, autostart: bool = True):
+        super().__init__()
+        self.path = path
+        self.autostart = autostart
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connected = asyncio.Event()
+
+    async def start(self):
+        await self._connect()
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        if self._server is not None:
+            self._server.close()
+
+    async def _connect(self):
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.path, limit=_LINE_LIMIT)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not self.autostart:
+                raise
+            await self._host_daemon()
+            reader, writer = await asyncio.open_unix_connection(self.path, limit=_LINE_LIMIT)
+        self._reader, self._writer = reader, writer
+        self._connected.set()
+
+    async def _host_daemon(self):
+        with open(self.path + ".lock", "w") as lock:
+            await _lock_exclusive(lock)
+            try:
+                # Someone may have won the race while we waited for the lock
+                _, w = await asyncio.open_unix_connection(self.path)
+                w.close()
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # stale socket from a dead host
+            self._server = await serve(self.path)
+            log.info("Broker daemon hosted by worker %s at %s", self.worker_id, self.path)
+
+    async def _read_loop(self):
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                # Daemon went away: reconnect (possibly hosting it ourselves)
+                self._connected.clear()
+                await asyncio.sleep(0.1)
+                try:
+                    await self._connect()
+                except OSError as e:
+                    log.error("Broker reconnect failed: %s", e)
+                    await asyncio.sleep(1.0)
+                continue
+            try:
+                envelope = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if self._handler is not None:
+                try:
+                    await self._handler(envelope)
+                except Exception as e:
+                    log.exception("Broker handler failed: %s", e)
+
+    async def publish(self, envelope: Envelope):
+        await super().publish(envelope)
+        if not self._connected.is_set():
+            return  # reconnecting: remote workers miss this one
+        self._writer.write(json.dumps(envelope).encode() + b"\n")
+        await self._writer.drain()
+
+
+async def _lock_exclusive(f, poll: float = 0.05, max_poll: float = 0.5):
+    """flock(LOCK_EX) without blocking the event loop: poll with LOCK_NB and back off."""
+    while True:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            await asyncio.sleep(poll)
+            poll = min(poll * 2, max_poll)
+
+
+async def serve(path: str, peer_buffer_max: int = _PEER_BUFFER_MAX,
+                peer_drain_sec: float = _PEER_DRAIN_SEC) -> asyncio.AbstractServer:
+    """Run the relay daemon: every line received from one client is sent to all others.
+
+    Writes are buffered; once a worker has more than `peer_buffer_max` bytes unsent, the relay
+    waits up to `peer_drain_sec` for it to catch up, and drops it if it doesn't (it reconnects,
+    missing what it could not take), so a stuck worker can't grow the daemon without bound.
+    """
+    clients: Set[asyncio.StreamWriter] = set()
+
+    async def _flush(peer: asyncio.StreamWriter):
+        try:
+            await asyncio.wait_for(peer.drain(), peer_drain_sec)
+        except (asyncio.TimeoutError, ConnectionError):
+            log.warning("Broker peer too slow (%d bytes unsent), dropping it",
+                        peer.transport.get_write_buffer_size())
+            clients.discard(peer)
+            peer.transport.abort()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        clients.add(writer)
+        try:
+            while line := await reader.readline():
+                for other in list(clients):
+                    if other is writer:
+                        continue
+                    other.write(line)
+                    if other.transport.get_write_buffer_size() > peer_buffer_max:
+                        await _flush(other)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            clients.discard(writer)
+            writer.close()
+
+    return await asyncio.start_unix_server(handle, path, limit=_LINE_LIMIT)
+
+
+def create_broker(url: Optional[str] = None) -> Broker:
+    """memory:// (default, single worker) or unix:///path/to/socket (workers on one host)."""
+    url = url or settings.BROKER_URL
+    if url.startswith("unix://"):
+        return UnixSocketBroker(url[len("unix://"):], autostart=settings.BROKER_AUTOSTART)
+    if url.startswith("memory://"):
+        return InProcessBroker()
+    raise ValueError(f"Unsupported BROKER_URL: {url}")
+
+
+if __name__ == "__main__":
+    # Standalone daemon: python -m app.broker /tmp/multichat-broker.sock
+    async def _main(path: str):
+        server = await serve(path)
+        print(f"Broker listening on {path}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "/tmp/multichat-broker.sock"))
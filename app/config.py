@@ -12,16 +12,117 @@ class Settings(BaseModel):
     model_config = ConfigDict(extra='allow')
     
     JLLM_API_KEY: str = "calhacks2047"
+    JLLM_URL: str = "https://janitorai.com/hackathon/completions"
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     DEFAULT_PERSONA_FILE: str = "persona.default.json"
     DEFAULT_PERSONA_JSON: str = ""
 
+    # Bot orchestration
+    BOT_FANOUT: bool = True  # gate + generate for all active bots concurrently
+    BOT_REPLY_ORDER: str = "mention"  # "mention" | "registry" | "name"
+    BOT_REPLY_SPACING_SEC: float = 0.5  # minimum gap between consecutive bot replies
+    # "per_bot": a YES/NO gate plus a generation call per bot; "combined": one structured
+    # speak_now + content call per bot; "batched": one structured call decides and writes for
+    # all active bots (per_bot fallback if the answer can't be parsed)
+    BOT_ROUTING_MODE: str = "per_bot"
+    # A bot round still gating/generating when this many newer human messages have arrived is
+    # cancelled, so the room moves on to them (0 = never); @mentioned bots finish regardless
+    BOT_STALE_AFTER_MESSAGES: int = 3
+    BOT_STALE_SPARE_MENTIONS: bool = True
+
+    # Per-room mailbox: coalesce bursts of human messages into one orchestration
+    ROOM_DEBOUNCE_SEC: float = 0.4  # quiet period that closes a burst
+    ROOM_DEBOUNCE_MAX_SEC: float = 2.0  # never hold a burst longer than this
+    ROOM_MAILBOX_MAX: int = 20  # bounded per-room backlog of pending triggers
+
+    # Global LLM admission control
+    LLM_MAX_CONCURRENCY: int = 16  # upstream calls in flight across all rooms
+
+    # LLM transport: connection pool, timeouts per call class, circuit breaker
+    LLM_POOL_MAX: int = 32
+    LLM_POOL_KEEPALIVE: int = 16
+    LLM_KEEPALIVE_SEC: float = 60.0
+    LLM_HTTP2: bool = False  # needs the optional 'h2' package
+    LLM_PREWARM_CONNECTIONS: int = 4
+    LLM_CONNECT_TIMEOUT_SEC: float = 3.0
+    LLM_TIMEOUT_GATING_SEC: float = 5.0
+    LLM_TIMEOUT_GENERATION_SEC: float = 30.0
+    LLM_TIMEOUT_FACTS_SEC: float = 20.0
+    LLM_BREAKER_FAILURES: int = 5  # consecutive upstream failures that open the circuit
+    LLM_BREAKER_RESET_SEC: float = 15.0  # how long it stays open before a trial call
+
+    # Hedged requests for tiny YES/NO gating calls
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.9  # fire the duplicate once the call is slower than this
+    LLM_HEDGE_DEFAULT_SEC: float = 1.5  # deadline until enough latencies have been seen
+    LLM_HEDGE_MAX_FRACTION: float = 0.1  # hedges per primary request, at most
+    LLM_HEDGE_BURST: float = 5.0
+
+    # Rendered system prompts kept in the LRU cache
+    PROMPT_CACHE_SIZE: int = 256
+
+    # WebSocket fan-out: bounded outbound queue per connection
+    WS_SEND_QUEUE_MAX: int = 256
+    WS_OVERFLOW_POLICY: str = "drop_typing"  # "drop_typing" (then disconnect) | "disconnect"
+    WS_PING_INTERVAL_SEC: float = 20.0  # server -> client {"type": "ping"}
+    WS_IDLE_TIMEOUT_SEC: float = 60.0  # evict sockets silent for this long (no frames, no pong)
+
+    # Cross-worker pub/sub: "memory://" (single process) or "unix:///tmp/multichat-broker.sock"
+    BROKER_URL: str = "memory://"
+    BROKER_AUTOSTART: bool = True  # first worker hosts the unix-socket daemon if none is running
+    # Each room is orchestrated by one owner worker, picked among workers that heartbeat in time
+    WORKER_HEARTBEAT_SEC: float = 2.0
+    WORKER_TIMEOUT_SEC: float = 6.0
+
+    # Background fact extraction: run after N new messages or once the room has been idle,
+    # and defer while the room has queued messages or the LLM queue is this deep
+    FACTS_EVERY_N_MESSAGES: int = 8
+    FACTS_IDLE_SEC: float = 20.0
+    FACTS_MAX_BATCH: int = 20
+    FACTS_SKIP_QUEUE_DEPTH: int = 4
+
+    # Speculative replies: start generating alongside the YES/NO gate for bots whose learned
+    # YES-rate (EWMA, starting at the prior) is at least the threshold
+    BOT_SPECULATION: bool = False
+    BOT_SPECULATE_MIN_YES_RATE: float = 0.6
+    BOT_YES_RATE_ALPHA: float = 0.2
+    BOT_YES_RATE_PRIOR: float = 0.5
+
+    # Prompt token budgets per call type (system prompt + instructions + history), and the
+    # most any single message may take before it is clipped
+    PROMPT_BUDGET_GENERATION: int = 3000
+    PROMPT_BUDGET_GATING: int = 500
+    PROMPT_BUDGET_DEBATE: int = 1200
+    PROMPT_BUDGET_FACTS: int = 1500
+    PROMPT_BUDGET_SUMMARY: int = 2000
+    PROMPT_MAX_MESSAGE_TOKENS: int = 400
+
+    # Per-user fact store caps (oldest, least repeated facts are evicted first)
+    FACTS_PER_USER_MAX: int = 12
+    FACTS_PER_ROOM_MAX: int = 80
+    FACT_MAX_CHARS: int = 120
+
+    # Rolling summary: keep the newest N messages raw, fold older ones into the summary in
+    # chunks, merge FANOUT summaries into one a level up
+    SUMMARY_LIVE_MESSAGES: int = 24
+    SUMMARY_CHUNK_MESSAGES: int = 16
+    SUMMARY_FANOUT: int = 4
+    SUMMARY_MAX_TOKENS: int = 200
+    SUMMARY_DEFER_SEC: float = 10.0
+
+    # Logging: level gate (DEBUG shows per-call detail) and output format ("text" or "json")
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+
+    # Stream replies token-by-token to clients as chat.delta / chat.done frames
+    LLM_STREAMING: bool = False
+
 
 def load_settings():
-    # Try to load from env, fallback to default
-    key = os.getenv("JLLM_API_KEY", "calhacks2047")
-    return Settings(JLLM_API_KEY=key)
+    # Every setting can be overridden by an env var of the same name, fallback to default
+    overrides = {k: v for k in Settings.model_fields if (v := os.getenv(k)) is not None}
+    return Settings(**overrides)
 
 
 settings = load_settings()
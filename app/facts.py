@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
+
+from .config import settings
+from .log import get_logger
+from .schemas import ChatMessage
+
+if TYPE_CHECKING:
+    from .state import RoomState
+
+log = get_logger("facts")
+
+
+class FactJob:
+    """Background, debounced fact extraction for one room.
+
+    Keeps a watermark (the id of the last message already handed to the extractor), so
+    every run only sees messages that arrived since. A run starts once FACTS_EVERY_N_MESSAGES
+    new messages are waiting, or after the room has been idle for FACTS_IDLE_SEC. While the
+    room is under load (`is_busy()` returns True) the run is pushed back by another idle
+    period instead; nothing ever waits on it on the reply path.
+    """
+
+    def __init__(
+        self,
+        room: "RoomState",
+        extract: Callable[[List[ChatMessage]], Awaitable[None]],
+        is_busy: Optional[Callable[[], bool]] = None,
+        every_n: Optional[int] = None,
+        idle_sec: Optional[float] = None,
+        max_batch: Optional[int] = None,
+    ):
+        self.room = room
+        self.extract = extract
+        self.is_busy = is_busy or (lambda: False)
+        self.every_n = every_n or settings.FACTS_EVERY_N_MESSAGES
+        self.idle_sec = settings.FACTS_IDLE_SEC if idle_sec is None else idle_sec
+        self.max_batch = max_batch or settings.FACTS_MAX_BATCH
+        self._watermark: Optional[str] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.deferred = 0
+        self.processed = 0
+        self.skipped = 0
+
+    def pending(self) -> List[ChatMessage]:
+        """Messages appended since the watermark (scans back from the end, O(pending))."""
+        history = self.room.history
+        if self._watermark is not None:
+            for i in range(len(history) - 1, -1, -1):
+                if history[i].id == self._watermark:
+                    return history[i + 1:]
+        return list(history)
+
+    def notify(self):
+        """Call after new messages land in the room; starts or (re)arms the job."""
+        if self._task is not None and not self._task.done():
+            return  # the running pass re-checks when it finishes
+        waiting = len(self.pending())
+        if waiting == 0:
+            return
+        if waiting >= self.every_n:
+            self._start()
+        else:
+            self._arm(self.idle_sec)
+
+    def _arm(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._start)
+
+    def _start(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is not None and not self._task.done():
+            return
+        if self.is_busy():
+            self.deferred += 1
+            self._arm(self.idle_sec)
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        batch = self.pending()
+        if len(batch) > self.max_batch:
+            # Fell far behind (e.g. a long busy spell): only the newest messages are worth a call
+            self.skipped += len(batch) - self.max_batch
+            batch = batch[-self.max_batch:]
+        if not batch:
+            return
+        # Advance first: messages arriving during the call belong to the next pass
+        self._watermark = batch[-1].id
+        self.runs += 1
+        self.processed += len(batch)
+        try:
+            await self.extract(batch)
+        except Exception as e:
+            log.exception("Fact extraction job failed for room %s: %s", self.room.id, e)
+        finally:
+            self._task = None
+        self.notify()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending()),
+            "runs": self.runs,
+            "deferred": self.deferred,
+            "processed": self.processed,
+            "skipped": self.skipped,
+        }
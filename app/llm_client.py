@@ -1,20 +1,21 @@
 from __future__ import annotations
 
 import json
+import time
 import asyncio
-from typing import AsyncGenerator, List, Dict, Any, Optional
+from typing import AsyncGenerator, AsyncIterator, List, Dict, Any, Optional
 
 import httpx
-from tenacity import retry, wait_exponential, stop_after_attempt
+from tenacity import retry, retry_if_exception, wait_exponential, stop_after_attempt
 
 from .config import settings
+from .scheduler import scheduler, PRIORITY_GENERATION, PRIORITY_NAMES
+from .transport import breaker, deadline_for, hedging, is_upstream_failure, timeout_for, error_kind
+from .metrics import LLM_REQUEST_SECONDS, LLM_REQUESTS, LLM_RETRIES, LLM_ERRORS
+from .preemption import mark_sent
 
 
-JLLM_URL = "https://janitorai.com/hackathon/completions"
-
-
-@retry(wait=wait_exponential(min=0.5, max=4), stop=stop_after_attempt(3))
-async def _post(client: httpx.AsyncClient, payload: Dict[str, Any], stream: bool = False):
+def _request_args(payload: Dict[str, Any], stream: bool, priority: int) -> Dict[str, Any]:
     headers = {
         "Authorization": settings.JLLM_API_KEY,
         "Content-Type": "application/json"
@@ -23,24 +24,258 @@ async def _post(client: httpx.AsyncClient, payload: Dict[str, Any], stream: bool
     # Don't include model field - API ignores it per spec
     payload_copy.pop("model", None)
     payload_copy["stream"] = stream
-    
-    resp = await client.post(JLLM_URL, json=payload_copy, headers=headers, timeout=30.0)
-    resp.raise_for_status()
+    return {"json": payload_copy, "headers": headers, "timeout": timeout_for(priority)}
+
+
+def _observe(priority: int, started: float, exc: Optional[BaseException] = None):
+    """Record one upstream attempt in the request metrics."""
+    call_class = PRIORITY_NAMES.get(priority, str(priority))
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, call_class=call_class)
+    LLM_REQUESTS.inc(call_class=call_class, outcome="ok" if exc is None else "error")
+    if exc is not None:
+        LLM_ERRORS.inc(call_class=call_class, kind=error_kind(exc))
+
+
+def _report(healthy: Optional[bool]):
+    """Tell the breaker what an attempt showed: healthy, failing, or nothing (cancelled)."""
+    if healthy is None:
+        breaker.abandon()
+    elif healthy:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
+def _deadline_exceeded(priority: int):
+    """A call ran past deadline_for(priority): counts as an upstream failure."""
+    LLM_ERRORS.inc(call_class=PRIORITY_NAMES.get(priority, str(priority)), kind="timeout")
+    breaker.record_failure()
+
+
+# Retry only upstream trouble (transport errors, 5xx, 429); never 4xx or an open circuit
+_retry = retry(
+    wait=wait_exponential(min=0.5, max=4),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception(is_upstream_failure),
+    reraise=True,
+    before_sleep=lambda _: LLM_RETRIES.inc(),
+)
+
+
+@_retry
+async def _post(client: httpx.AsyncClient, payload: Dict[str, Any], stream: bool = False,
+                priority: int = PRIORITY_GENERATION):
+    started = time.perf_counter()
+    try:
+        breaker.before_call()
+    except Exception as e:
+        _observe(priority, started, e)
+        raise
+    healthy = None
+    try:
+        resp = await client.post(settings.JLLM_URL, **_request_args(payload, stream, priority))
+        resp.raise_for_status()
+        healthy = True
+    except Exception as e:
+        _observe(priority, started, e)
+        healthy = not is_upstream_failure(e)
+        raise
+    finally:
+        _report(healthy)
+    _observe(priority, started)
     return resp
 
 
-async def chat(
-    client: httpx.AsyncClient, messages: List[Dict[str, Any]], params: Dict[str, Any], stream: bool = False
-) -> AsyncGenerator[str, None] | Dict[str, Any]:
+@_retry
+async def _post_stream(client: httpx.AsyncClient, payload: Dict[str, Any],
+                       priority: int = PRIORITY_GENERATION) -> httpx.Response:
+    """Open a streaming response; only the request itself is retried, never a half-read body.
+
+    The caller owns the returned response and must aclose() it. The recorded request
+    latency is time to response headers.
+    """
+    started = time.perf_counter()
+    try:
+        breaker.before_call()
+    except Exception as e:
+        _observe(priority, started, e)
+        raise
+    req = client.build_request("POST", settings.JLLM_URL, **_request_args(payload, True, priority))
+    healthy = None
+    try:
+        resp = await client.send(req, stream=True)
+        try:
+            resp.raise_for_status()
+        except httpx.HTTPStatusError:
+            await resp.aclose()
+            raise
+        healthy = True
+    except Exception as e:
+        _observe(priority, started, e)
+        healthy = not is_upstream_failure(e)
+        raise
+    finally:
+        _report(healthy)
+    _observe(priority, started)
+    return resp
+
+
+def _build_payload(messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
     payload = {"messages": messages}
     # Add params but exclude None values
     if params:
         for k, v in params.items():
             if v is not None:
                 payload[k] = v
-    
-    # Always get non-streaming response by setting stream=false in payload
-    resp = await _post(client, payload, stream=False)
+    return payload
+
+
+def _chunk_text(chunk: Dict[str, Any]) -> str:
+    """Text carried by one SSE chunk (delta) or by a complete, non-streamed response."""
+    choice = (chunk.get("choices") or [{}])[0]
+    delta = choice.get("delta") or choice.get("message") or {}
+    return delta.get("content") or choice.get("text") or ""
+
+
+async def _iter_sse_deltas(lines: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """Incrementally parse SSE lines into content deltas.
+
+    If the upstream ignores stream=true and sends a plain JSON body instead, the body is
+    buffered and its full content is yielded once at the end.
+    """
+    body = []
+    async for line in lines:
+        line = line.strip()
+        if not line.startswith("data:"):
+            if line:
+                body.append(line)
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            delta = _chunk_text(json.loads(data))
+        except (json.JSONDecodeError, AttributeError, IndexError):
+            continue
+        if delta:
+            yield delta
+    if body:
+        try:
+            text = _chunk_text(json.loads("\n".join(body)))
+        except (json.JSONDecodeError, AttributeError, IndexError):
+            return
+        if text:
+            yield text
+
+
+async def chat_stream(
+    client: httpx.AsyncClient,
+    messages: List[Dict[str, Any]],
+    params: Dict[str, Any],
+    priority: int = PRIORITY_GENERATION,
+    room_id: Optional[str] = None,
+) -> AsyncGenerator[str, None]:
+    """Yield completion text deltas as the upstream produces them.
+
+    The scheduler slot is held until the stream is exhausted or closed. The whole stream,
+    from the request to the last delta, must finish within deadline_for(priority): a stream
+    that keeps trickling raises TimeoutError like one that never starts.
+    """
+    async with scheduler.slot(priority, room_id):
+        mark_sent()
+        deadline = asyncio.get_running_loop().time() + deadline_for(priority)
+        try:
+            # Only our own awaits are bounded, never the caller's work between deltas
+            async with asyncio.timeout_at(deadline):
+                resp = await _post_stream(client, _build_payload(messages, params), priority)
+            try:
+                deltas = _iter_sse_deltas(resp.aiter_lines())
+                while True:
+                    async with asyncio.timeout_at(deadline):
+                        try:
+                            delta = await deltas.__anext__()
+                        except StopAsyncIteration:
+                            return
+                    yield delta
+            finally:
+                await resp.aclose()
+        except TimeoutError:
+            _deadline_exceeded(priority)
+            raise
+
+
+async def _scheduled_post(client: httpx.AsyncClient, payload: Dict[str, Any], priority: int, room_id: Optional[str],
+                          sent: Optional[asyncio.Event] = None):
+    async with scheduler.slot(priority, room_id):
+        mark_sent()  # from here on a stale bot round lets the call finish (see preemption)
+        if sent is not None:
+            sent.set()
+        try:
+            async with asyncio.timeout(deadline_for(priority)):
+                return await _post(client, payload, stream=False, priority=priority)
+        except TimeoutError:
+            _deadline_exceeded(priority)
+            raise
+
+
+async def _hedged_post(client: httpx.AsyncClient, payload: Dict[str, Any], priority: int, room_id: Optional[str]):
+    """Send the request; if it hasn't answered by the adaptive deadline, race a duplicate.
+
+    The deadline (and the latency it learns from) counts from when the primary leaves the
+    local scheduler queue: a request still queued is slow because we are saturated, and a
+    duplicate would only queue behind it. The first successful answer wins and the other
+    request is cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    hedging.on_primary()
+    sent = asyncio.Event()
+    primary = asyncio.create_task(_scheduled_post(client, payload, priority, room_id, sent))
+    tasks = {primary}
+    sent_wait = asyncio.create_task(sent.wait())
+    try:
+        await asyncio.wait({primary, sent_wait}, return_when=asyncio.FIRST_COMPLETED)
+        started = loop.time()
+        done, _ = await asyncio.wait(tasks, timeout=hedging.deadline())
+        if not done and hedging.try_hedge():
+            tasks.add(asyncio.create_task(_scheduled_post(client, payload, priority, room_id)))
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    hedging.record(loop.time() - started, hedge_won=task is not primary)
+                    return task.result()
+        # Every attempt failed: surface the primary's error
+        return primary.result()
+    finally:
+        sent_wait.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def chat(
+    client: httpx.AsyncClient,
+    messages: List[Dict[str, Any]],
+    params: Dict[str, Any],
+    stream: bool = False,
+    priority: int = PRIORITY_GENERATION,
+    room_id: Optional[str] = None,
+    hedge: bool = False,
+) -> AsyncGenerator[str, None] | Dict[str, Any]:
+    """Call the completions endpoint through the global scheduler.
+
+    `priority` is one of the scheduler.PRIORITY_* classes; `room_id` is used for fair
+    queuing between rooms. `hedge=True` opts a (small, non-streaming) call into hedged
+    requests when LLM_HEDGE_ENABLED is set.
+    """
+    if stream:
+        # Caller iterates: `async for delta in await chat(..., stream=True)`
+        return chat_stream(client, messages, params, priority, room_id)
+
+    payload = _build_payload(messages, params)
+    if hedge and settings.LLM_HEDGE_ENABLED:
+        resp = await _hedged_post(client, payload, priority, room_id)
+    else:
+        resp = await _scheduled_post(client, payload, priority, room_id)
     try:
         data = resp.json()
         return data
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+
+# Current orchestration trace: id plus the span timings collected so far. Tasks spawned
+# inside a trace inherit the context, so fan-out spans land in the same list.
+_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("multichat_trace", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Trace:
+    def __init__(self, name: str, **fields):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.fields = fields
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"multichat.{name}")
+
+
+def current_trace_id() -> Optional[str]:
+    t = _trace.get()
+    return t.id if t is not None else None
+
+
+class _TraceFilter(logging.Filter):
+    """Stamp each record with the trace id of the task that logged it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = current_trace_id()
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the listener thread with only %-interpolation done on the loop.
+
+    The stock QueueHandler runs the full formatter in the caller; here formatting (and the
+    stdout write) happen on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            out["trace_id"] = record.trace_id
+        out.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s%(trace)s %(message)s%(extra_fields)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        trace_id = getattr(record, "trace_id", None)
+        record.trace = f" [{trace_id}]" if trace_id else ""
+        fields = getattr(record, "fields", None)
+        record.extra_fields = (" " + " ".join(f"{k}={_text_value(v)}" for k, v in fields.items())) if fields else ""
+        return super().format(record)
+
+
+def _text_value(value: Any) -> str:
+    if isinstance(value, list) and value and all(isinstance(v, dict) and "span" in v for v in value):
+        # spans as name(fields)@start+duration, e.g. gate(bot=Saitama)@0.2+140.3ms
+        out = []
+        for s in value:
+            extra = ",".join(f"{k}={v}" for k, v in s.items() if k not in ("span", "start_ms", "ms"))
+            out.append(f"{s['span']}{f'({extra})' if extra else ''}@{s['start_ms']}+{s['ms']}ms")
+        return "[" + " ".join(out) + "]"
+    return str(value)
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """Route the multichat.* loggers through a background queue listener.
+
+    Idempotent; LOG_LEVEL gates records before any work is done, LOG_FORMAT picks text or json.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger("multichat")
+    root.setLevel((level or settings.LOG_LEVEL).upper())
+    root.propagate = False
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if (fmt or settings.LOG_FORMAT) == "json" else TextFormatter())
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(q)
+    handler.addFilter(_TraceFilter())
+    root.handlers[:] = [handler]
+    _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def trace(name: str, logger: Optional[logging.Logger] = None, **fields):
+    """Open a trace for one unit of work (e.g. one orchestration).
+
+    On exit, one INFO record summarizes the total time and every span recorded inside it.
+    """
+    t = Trace(name, **fields)
+    token = _trace.set(t)
+    try:
+        yield t
+    finally:
+        _trace.reset(token)
+        log = logger or get_logger("trace")
+        if log.isEnabledFor(logging.INFO):
+            total_ms = (time.perf_counter() - t.started) * 1000
+            log.info(
+                "%s done in %.1f ms", name, total_ms,
+                extra={"trace_id": t.id, "fields": {**t.fields, "spans": t.spans}},
+            )
+
+
+@contextmanager
+def span(name: str, **fields):
+    """Time a step of the current trace (gate, generate, broadcast...). No-op outside a trace."""
+    t = _trace.get()
+    if t is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.spans.append({
+            "span": name,
+            "start_ms": round((started - t.started) * 1000, 1),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            **fields,
+        })
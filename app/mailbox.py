@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional
+
+from .config import settings
+from .log import get_logger
+from .schemas import ChatMessage
+
+log = get_logger("mailbox")
+
+
+class RoomMailbox:
+    """Single-consumer mailbox that drives one room's orchestration (actor style).
+
+    Human messages are posted without blocking. A single consumer task waits until the
+    room has been quiet for `debounce_sec` (but never longer than `max_wait_sec` after the
+    first pending message), then hands everything that arrived to the handler as one batch.
+    Messages posted while the handler runs are coalesced into the next batch, so at most one
+    orchestration per room is ever in flight. The backlog is bounded: when full, the oldest
+    pending trigger is dropped (the message itself is already in the room history).
+    `on_post` is called synchronously for every posted message (e.g. to preempt stale work).
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[ChatMessage]], Awaitable[None]],
+        debounce_sec: Optional[float] = None,
+        max_wait_sec: Optional[float] = None,
+        max_backlog: Optional[int] = None,
+        on_post: Optional[Callable[[ChatMessage], None]] = None,
+    ):
+        self.handler = handler
+        self.on_post = on_post
+        self.debounce_sec = settings.ROOM_DEBOUNCE_SEC if debounce_sec is None else debounce_sec
+        self.max_wait_sec = settings.ROOM_DEBOUNCE_MAX_SEC if max_wait_sec is None else max_wait_sec
+        self.max_backlog = max_backlog or settings.ROOM_MAILBOX_MAX
+        self._pending: Deque[ChatMessage] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def post(self, msg: ChatMessage):
+        if len(self._pending) >= self.max_backlog:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(msg)
+        if self.on_post is not None:
+            self.on_post(msg)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _debounce(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_sec
+        while True:
+            self._wakeup.clear()
+            timeout = min(self.debounce_sec, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def _run(self):
+        while self._pending:
+            await self._debounce()
+            batch = list(self._pending)
+            self._pending.clear()
+            self.batches += 1
+            self.coalesced += len(batch) - 1
+            try:
+                await self.handler(batch)
+            except Exception as e:
+                log.exception("Room mailbox handler failed: %s", e)
+
+    def close(self):
+        self._pending.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self.backlog,
+            "busy": self.busy,
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
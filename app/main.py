@@ -4,22 +4,34 @@ import asyncio
 import json
 import uuid
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import httpx
 
 from .config import settings, load_default_persona
 from .websocket import ConnectionManager
 from .state import RoomState
-from .schemas import PersonaConfig, LLMParams
-from .orchestrator import should_ai_respond, call_llm, apply_structured_response, detect_moral_dilemma, handle_moral_dilemma, should_bot_respond, call_bot_llm
+from .mailbox import RoomMailbox
+from .facts import FactJob
+from .summarizer import Summarizer
+from .scheduler import scheduler
+from .transport import breaker, hedging, create_client, prewarm
+from .persona import render_cache_stats
+from .speculation import speculation
+from .preemption import preemption_stats
+from .ownership import RoomOwnership
+from .metrics import registry, ORCHESTRATIONS_IN_FLIGHT
+from .log import get_logger, setup_logging, shutdown_logging, trace, span
+from .schemas import PersonaConfig, LLMParams, ChatMessage, RoomMemory
+from .orchestrator import should_ai_respond, call_llm, apply_structured_response, detect_moral_dilemma, handle_moral_dilemma, run_bot_round, extract_and_store_facts, MORAL_DETECTOR_STATS, BOT_ROUTING_STATS
 from .bot_personas import BOT_PERSONAS, BOT_METADATA
+from .moral_agents import MORAL_AGENTS
 
 app = FastAPI()
+log = get_logger("main")
 
 # Add CORS for React dev server
 app.add_middleware(
@@ -41,6 +53,155 @@ app.mount("/static", StaticFiles(directory=str(web_dir)), name="static")
 
 manager = ConnectionManager()
 rooms: Dict[str, RoomState] = {}
+# Which worker orchestrates each room (always this one with the in-process broker)
+ownership = RoomOwnership(manager.broker.worker_id, manager.publish)
+
+registry.gauge("multichat_active_rooms", "Rooms known to this worker", lambda: len(rooms))
+registry.gauge("multichat_active_sockets", "WebSockets held by this worker", lambda: manager.stats()["live"])
+registry.gauge("multichat_llm_queue_depth", "LLM calls waiting for a scheduler slot", lambda: scheduler.queue_depth)
+registry.gauge("multichat_llm_breaker_open", "1 while the upstream circuit breaker is not closed", lambda: int(breaker.state != "closed"))
+
+
+def _combine_messages(batch: List[ChatMessage]) -> str:
+    """Fold a coalesced burst of human messages into one prompt message."""
+    if len(batch) == 1:
+        return batch[0].content
+    return "\n".join(f"{m.user}: {m.content}" for m in batch)
+
+
+async def _run_orchestrator(room: RoomState, batch: List[ChatMessage]):
+    room_id = room.id
+    content = _combine_messages(batch)
+    # Messages posted after this point are newer than the batch and can make its replies stale
+    human_seq = room.rounds.human_seq
+    ORCHESTRATIONS_IN_FLIGHT.inc()
+    try:
+        with trace("orchestration", log, room=room_id, messages=len(batch)):
+            # Check for moral dilemma FIRST (bypasses turn-taking)
+            try:
+                with span("detect_moral_dilemma"):
+                    is_moral = await detect_moral_dilemma(app.state.httpx_client, room, content)
+            except Exception as e:
+                log.error("detect_moral_dilemma error: %s", e)
+                is_moral = False
+
+            if is_moral:
+                log.debug("Moral dilemma detected - running debate flow (bypassing turn-taking)")
+                await handle_moral_dilemma(app.state.httpx_client, room, content, lambda m: manager.broadcast(room_id, m))
+                return  # Exit early after debate
+
+            # Let each active bot autonomously decide if it should respond
+            log.debug("Active bots: %s", room.active_bots)
+            await run_bot_round(app.state.httpx_client, room, content, lambda m: manager.broadcast(room_id, m), human_seq=human_seq)
+    except Exception as e:
+        log.exception("Exception in orchestrator: %s", e)
+        await manager.broadcast(room_id, {"type": "error", "message": str(e)})
+    finally:
+        ORCHESTRATIONS_IN_FLIGHT.dec()
+        # Facts and the rolling summary are updated in the background, after the replies are out
+        if room.facts is not None:
+            room.facts.notify()
+        if room.summarizer is not None:
+            room.summarizer.notify()
+
+
+def _room_busy(room: RoomState) -> bool:
+    """Defer background work while humans are waiting on this room or the LLM queue is backed up."""
+    return (room.mailbox is not None and room.mailbox.backlog > 0) or scheduler.queue_depth >= settings.FACTS_SKIP_QUEUE_DEPTH
+
+
+def _mailbox_for(room: RoomState) -> RoomMailbox:
+    """The room's mailbox and background jobs; only the room's owner worker creates them."""
+    if room.mailbox is None:
+        room.mailbox = RoomMailbox(lambda batch: _run_orchestrator(room, batch), on_post=room.rounds.on_human_message)
+    if room.facts is None:
+        async def _extract(messages: List[ChatMessage]):
+            await extract_and_store_facts(app.state.httpx_client, room, messages)
+            await _publish_memory(room)
+
+        room.facts = FactJob(room, _extract, is_busy=lambda: _room_busy(room))
+    if room.summarizer is None:
+        room.summarizer = Summarizer(
+            room, app.state.httpx_client, is_busy=lambda: _room_busy(room), on_update=lambda: _publish_memory(room),
+        )
+    return room.mailbox
+
+
+async def _post(room: RoomState, msg: ChatMessage):
+    """Hand a human message to the room's orchestration, on whichever worker owns the room."""
+    owner = ownership.owner(room.id)
+    if owner == ownership.worker_id:
+        _mailbox_for(room).post(msg)
+    else:
+        # The owner already has the message in its history from the chat frame (same connection, sent first)
+        await manager.publish("post", room.id, {"owner": owner, "message": msg.model_dump(mode="json")})
+
+
+def _release_unowned():
+    """After the set of live workers changed: stop background jobs of rooms now owned elsewhere.
+
+    A round already running on the old owner finishes; new messages go to the new owner.
+    """
+    for room in rooms.values():
+        if ownership.owns(room.id):
+            continue
+        if room.facts is not None:
+            room.facts.close()
+            room.facts = None
+        if room.summarizer is not None:
+            room.summarizer.close()
+            room.summarizer = None
+
+
+# Speakers whose replicated chat frames are stored as assistant messages
+_BOT_SPEAKERS = {p.name for p in BOT_PERSONAS.values()} | {p.name for p in MORAL_AGENTS.values()}
+
+
+async def _publish_room(room: RoomState):
+    """Replicate room metadata to the other workers."""
+    await manager.publish("room", room.id, room.snapshot())
+
+
+async def _publish_memory(room: RoomState):
+    """Replicate the owner's room memory (facts, rolling summary) to the other workers."""
+    await manager.publish("memory", room.id, {
+        "memory": room.memory.model_dump(),
+        # Messages not covered by the summary, counted from the end (indexes differ per worker)
+        "live": len(room.history) - room.summarized_upto,
+    })
+
+
+async def _on_remote(envelope: Dict):
+    """Keep this worker's room replicas in sync with events published by other workers."""
+    kind = envelope.get("kind")
+    room_id = envelope.get("room_id")
+    data = envelope.get("data") or {}
+    if kind == "room":
+        if room_id in rooms:
+            rooms[room_id].apply_snapshot(data)
+        else:
+            rooms[room_id] = RoomState.from_snapshot(data)
+    elif kind == "sync":
+        for room in list(rooms.values()):
+            await _publish_room(room)
+            if ownership.owns(room.id):
+                await _publish_memory(room)
+    elif kind == "worker":
+        await ownership.on_worker(envelope.get("origin"), data)
+    elif kind == "post" and data.get("owner") == ownership.worker_id:
+        if room_id in rooms:
+            _mailbox_for(rooms[room_id]).post(ChatMessage(**data["message"]))
+        else:
+            log.warning("Message posted for unknown room %s", room_id)
+    elif kind == "memory" and room_id in rooms and not ownership.owns(room_id):
+        room = rooms[room_id]
+        room.memory = RoomMemory(**data["memory"])
+        room.summarized_upto = max(0, len(room.history) - data.get("live", len(room.history)))
+    elif kind == "frame" and data.get("type") in ("chat", "chat.done") and not data.get("aborted") and room_id in rooms:
+        room = rooms[room_id]
+        user = data.get("user")
+        is_ai = data.get("is_bot") or user in _BOT_SPEAKERS or user == room.persona.name
+        room.append_message(user, "assistant" if is_ai else "user", data.get("content") or "")
 
 
 class CreateRoomRequest(BaseModel):
@@ -51,13 +212,31 @@ class CreateRoomRequest(BaseModel):
 
 @app.on_event("startup")
 async def on_startup():
-    # create a global httpx client on app state
-    app.state.httpx_client = httpx.AsyncClient()
+    setup_logging()
+    # create a global httpx client on app state, and open its connections ahead of the first message
+    app.state.httpx_client = create_client()
+    asyncio.create_task(prewarm(app.state.httpx_client, settings.JLLM_URL))
+    manager.on_remote = _on_remote
+    ownership.on_change = _release_unowned
+    await manager.start()
+    await ownership.start()
+    # Ask already-running workers for the rooms they know about
+    await manager.publish("sync", None, {})
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    for room in rooms.values():
+        if room.mailbox is not None:
+            room.mailbox.close()
+        if room.facts is not None:
+            room.facts.close()
+        if room.summarizer is not None:
+            room.summarizer.close()
+    await ownership.stop()
+    await manager.stop()
     await app.state.httpx_client.aclose()
+    shutdown_logging()
 
 
 @app.get("/health")
@@ -65,6 +244,32 @@ async def health():
     return JSONResponse({"status": "ok"})
 
 
+@app.get("/api/stats")
+async def get_stats():
+    """Runtime stats: LLM scheduler, breaker and hedging, sockets, prompt cache, dilemma detector, room ownership, bot routing, speculation, stale-round preemption, mailboxes, fact jobs and summarizers"""
+    return JSONResponse({
+        "scheduler": scheduler.stats(),
+        "llm_breaker": breaker.stats(),
+        "llm_hedging": hedging.stats(),
+        "connections": manager.stats(),
+        "ownership": {**ownership.stats(), "owned_rooms": sum(ownership.owns(r) for r in rooms)},
+        "prompt_cache": render_cache_stats(),
+        "moral_detector": dict(MORAL_DETECTOR_STATS),
+        "bot_routing": {"mode": settings.BOT_ROUTING_MODE, **{k: dict(v) for k, v in BOT_ROUTING_STATS.items()}},
+        "speculation": speculation.stats(),
+        "preemption": preemption_stats(),
+        "mailboxes": {room_id: room.mailbox.stats() for room_id, room in rooms.items() if room.mailbox is not None},
+        "facts": {room_id: room.facts.stats() for room_id, room in rooms.items() if room.facts is not None},
+        "summaries": {room_id: room.summarizer.stats() for room_id, room in rooms.items() if room.summarizer is not None},
+    })
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint: stage latency histograms, LLM request/retry/error counters, gauges"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/api/bots")
 async def get_bots():
     """Return available bot personalities"""
@@ -100,6 +305,7 @@ async def create_room(request: CreateRoomRequest):
     
     # Store room
     rooms[room_id] = room
+    await _publish_room(room)
     
     return JSONResponse({
         "room_id": room_id,
@@ -168,26 +374,30 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
         room: RoomState = rooms[room_id]
         
         # Send room state including active bots to the connecting client
-        await websocket.send_text(json.dumps({
+        await manager.send(room_id, websocket, {
             "type": "room_state",
             "room_id": room_id,
             "name": room.name,
             "admin": room.admin,
             "active_bots": list(room.active_bots)
-        }))
+        })
 
         while True:
             data = await websocket.receive_text()
+            manager.touch(room_id, websocket)
             try:
                 obj = json.loads(data)
             except Exception:
-                await websocket.send_text(json.dumps({"type": "error", "message": "invalid json"}))
+                await manager.send(room_id, websocket, {"type": "error", "message": "invalid json"})
                 continue
 
             typ = obj.get("type")
-            if typ == "join":
+            if typ == "pong":
+                continue  # heartbeat reply, already recorded by touch()
+            elif typ == "join":
                 user = obj.get("user")
                 room.users.add(user)
+                await _publish_room(room)
                 await manager.broadcast(room_id, {"type": "system", "event": "joined", "user": user})
             elif typ == "chat":
                 user = obj.get("user")
@@ -196,73 +406,22 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
                 msg = room.append_message(user, "user", content)
                 await manager.broadcast(room_id, {"type": "chat", "user": user, "content": content, "ts": msg.ts.isoformat()})
 
-                # orchestrate AI in background
-                async def _run_orchestrator():
-                    try:
-                        # Check for moral dilemma FIRST (bypasses turn-taking)
-                        print(f"[DEBUG] Checking if this is a moral dilemma...")
-                        try:
-                            is_moral = await detect_moral_dilemma(app.state.httpx_client, room, content)
-                        except Exception as e:
-                            print(f"[ERROR] detect_moral_dilemma error: {e}")
-                            is_moral = False
-
-                        if is_moral:
-                            print(f"[DEBUG] Moral dilemma detected - running debate flow (bypassing turn-taking)")
-                            await handle_moral_dilemma(app.state.httpx_client, room, content, lambda m: manager.broadcast(room_id, m))
-                            return  # Exit early after debate
-                        
-                        # Let each active bot autonomously decide if it should respond
-                        print(f"[DEBUG] Active bots: {room.active_bots}")
-                        for bot_id in room.active_bots:
-                            if bot_id not in BOT_PERSONAS:
-                                continue
-                            
-                            bot_persona = BOT_PERSONAS[bot_id]
-                            print(f"[DEBUG] Checking if {bot_persona.name} should respond...")
-                            
-                            # Check if bot should respond to this message
-                            should_respond = await should_bot_respond(app.state.httpx_client, room, bot_persona, content)
-                            print(f"[DEBUG] {bot_persona.name} should_respond: {should_respond}")
-                            
-                            if should_respond:
-                                print(f"[DEBUG] {bot_persona.name} is responding...")
-                                # Generate response with bot's persona
-                                response = await call_bot_llm(app.state.httpx_client, room, bot_persona, content)
-                                
-                                # Broadcast bot response with bot name
-                                bot_msg = room.append_message(bot_persona.name, "assistant", response)
-                                await manager.broadcast(room_id, {
-                                    "type": "chat",
-                                    "user": bot_persona.name,
-                                    "content": response,
-                                    "ts": bot_msg.ts.isoformat(),
-                                    "is_bot": True,
-                                    "bot_id": bot_id
-                                })
-                                
-                                # Small delay between bots to prevent overwhelming
-                                await asyncio.sleep(0.5)
-                    except Exception as e:
-                        print(f"[ERROR] Exception in orchestrator: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        await manager.broadcast(room_id, {"type": "error", "message": str(e)})
-
-                asyncio.create_task(_run_orchestrator())
+                # orchestrate AI in background, one orchestration per room at a time (on its owner worker)
+                await _post(room, msg)
 
             elif typ == "bot.add":
                 user = obj.get("user")
                 bot_id = obj.get("bot_id")
                 # Check if user is admin
                 if user != room.admin:
-                    await websocket.send_text(json.dumps({
+                    await manager.send(room_id, websocket, {
                         "type": "error", 
                         "message": "Only the room admin can add bots"
-                    }))
+                    })
                     continue
                 if bot_id in BOT_PERSONAS:
                     room.active_bots.add(bot_id)
+                    await _publish_room(room)
                     await manager.broadcast(room_id, {
                         "type": "system",
                         "event": "bot.added",
@@ -274,13 +433,14 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
                 bot_id = obj.get("bot_id")
                 # Check if user is admin
                 if user != room.admin:
-                    await websocket.send_text(json.dumps({
+                    await manager.send(room_id, websocket, {
                         "type": "error", 
                         "message": "Only the room admin can remove bots"
-                    }))
+                    })
                     continue
                 if bot_id in room.active_bots:
                     room.active_bots.remove(bot_id)
+                    await _publish_room(room)
                     await manager.broadcast(room_id, {
                         "type": "system",
                         "event": "bot.removed",
@@ -296,18 +456,22 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
                 persona_obj = obj.get("persona")
                 try:
                     room.persona = PersonaConfig(**persona_obj)
+                    await _publish_room(room)
                     await manager.broadcast(room_id, {"type": "system", "event": "persona.updated"})
                 except Exception as e:
-                    await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+                    await manager.send(room_id, websocket, {"type": "error", "message": str(e)})
             elif typ == "sliders.update":
                 params = obj.get("params")
                 try:
                     room.params = LLMParams(**params)
+                    await _publish_room(room)
                     await manager.broadcast(room_id, {"type": "system", "event": "params.updated"})
                 except Exception as e:
-                    await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+                    await manager.send(room_id, websocket, {"type": "error", "message": str(e)})
             else:
-                await websocket.send_text(json.dumps({"type": "error", "message": "unknown message type"}))
+                await manager.send(room_id, websocket, {"type": "error", "message": "unknown message type"})
 
     except WebSocketDisconnect:
+        pass
+    finally:
         await manager.disconnect(room_id, websocket)
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import functools
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Seconds; covers fast YES/NO gates through slow streamed generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_fmt_labels(key)} {_fmt_value(value)}"
+
+
+class Gauge(_Metric):
+    """Point-in-time value: set directly, or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+        self.fn = fn
+
+    def set(self, value: float, **labels):
+        self._values[_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is not None:
+            yield f"{self.name} {_fmt_value(self.fn())}"
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_fmt_labels(key)} {_fmt_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (Prometheus semantics), one series per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        for key, (counts, total) in self._series.items():
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                yield f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(bound)))} {running}"
+            running += counts[-1]
+            yield f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {running}"
+            yield f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total[0])}"
+            yield f"{self.name}_count{_fmt_labels(key)} {running}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, fn: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, help, fn))
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "multichat_stage_seconds",
+    "Wall time of one orchestration pipeline stage",
+)
+LLM_REQUEST_SECONDS = registry.histogram(
+    "multichat_llm_request_seconds",
+    "Upstream LLM request latency per attempt, by call class",
+)
+LLM_REQUESTS = registry.counter(
+    "multichat_llm_requests_total",
+    "Upstream LLM request attempts by call class and outcome",
+)
+LLM_RETRIES = registry.counter(
+    "multichat_llm_retries_total",
+    "Upstream LLM requests retried after a transient failure",
+)
+LLM_ERRORS = registry.counter(
+    "multichat_llm_errors_total",
+    "Upstream LLM failures by kind (http_5xx, http_429, http_4xx, timeout, transport, circuit_open)",
+)
+BOT_REPLIES = registry.counter(
+    "multichat_bot_replies_total",
+    "Replies broadcast per bot",
+)
+BOT_GATE_DECISIONS = registry.counter(
+    "multichat_bot_gate_decisions_total",
+    "YES/NO gate outcomes per bot (mention, yes, no, error)",
+)
+BOT_SPECULATION = registry.counter(
+    "multichat_bot_speculation_total",
+    "Replies generated alongside the gate, by bot and outcome (hit: gate said YES, waste: NO)",
+)
+BOT_PREEMPTED = registry.counter(
+    "multichat_bot_preempted_total",
+    "Bot jobs cancelled because newer human messages made the round stale, by stage reached",
+)
+PROMPT_TOKENS = registry.histogram(
+    "multichat_prompt_tokens",
+    "Estimated size of packed prompts by call type (compare with the PROMPT_BUDGET_* settings)",
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000),
+)
+PROMPT_TRUNCATED = registry.counter(
+    "multichat_prompt_truncated_messages_total",
+    "Messages clipped to fit a prompt budget, by call type",
+)
+PROMPT_OVER_BUDGET = registry.counter(
+    "multichat_prompt_over_budget_total",
+    "Prompts whose fixed parts alone exceed the call type's budget (sent anyway), by call type",
+)
+ORCHESTRATIONS_IN_FLIGHT = registry.gauge(
+    "multichat_orchestrations_in_flight",
+    "Room orchestrations currently running",
+)
+
+
+def stage_timer(stage: str):
+    """Decorate an async function so each call is observed in multichat_stage_seconds{stage=...}."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -2,28 +2,130 @@ from __future__ import annotations
 
 import asyncio
 import json
-from typing import List, Dict, Any, Optional
+import re
+import uuid
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 import time
 import httpx
 
+from .config import settings
 from .persona import render_system
-from .schemas import LLMStructuredResponse, LLMParams, ChatMessage
+from .packer import pack, clip, as_line, budget_for, TokenIndex, LINE_OVERHEAD, MESSAGE_OVERHEAD
+from .tokens import estimate_tokens
+from .schemas import LLMStructuredResponse, BotReply, BatchedBotReplies, LLMParams, ChatMessage, PersonaConfig
 from .state import RoomState
 from .llm_client import chat
+from .scheduler import PRIORITY_MENTION, PRIORITY_GENERATION, PRIORITY_GATING, PRIORITY_FACTS
+from .metrics import STAGE_SECONDS, BOT_REPLIES, BOT_GATE_DECISIONS, stage_timer
+from .log import get_logger, span
+from .speculation import speculation, HeldDeltas
+from .preemption import enter_stage, spawn
 from .moral_agents import MORAL_AGENTS
+from .bot_personas import BOT_PERSONAS
 
+log = get_logger("orchestrator")
 
+
+async def _complete(client: httpx.AsyncClient, messages: List[Dict[str, Any]], params: Dict[str, Any],
+                    on_delta: Optional[Callable[[str], Awaitable[Any]]] = None,
+                    priority: int = PRIORITY_GENERATION, room_id: Optional[str] = None) -> str:
+    """Return the completion text; when on_delta is given, stream it and forward each delta as it arrives."""
+    if on_delta is None:
+        resp = await chat(client=client, messages=messages, params=params, stream=False, priority=priority, room_id=room_id)
+        if isinstance(resp, dict):
+            return resp.get("choices", [])[0].get("message", {}).get("content", "").strip()
+        return str(resp).strip()
+
+    parts = []
+    async for delta in await chat(client=client, messages=messages, params=params, stream=True, priority=priority, room_id=room_id):
+        parts.append(delta)
+        await on_delta(delta)
+    return "".join(parts).strip()
+
+
+class _DeltaSender:
+    """on_delta callback forwarding chat.delta frames for one stream, which it then closes exactly once.
+
+    Once any delta has gone out the client holds a partial bubble for stream_id, so the stream
+    must end in a chat.done: finish() builds it for the delivered reply, abort() sends an empty
+    one (flagged aborted) when the reply failed, came out empty or was dropped.
+    """
+
+    def __init__(self, broadcast_fn, stream_id: str, user: str, **extra):
+        self._broadcast = broadcast_fn
+        self.stream_id = stream_id
+        self.user = user
+        self.extra = extra
+        self.started = False
+        self.closed = False
+
+    async def __call__(self, delta: str):
+        self.started = True
+        await self._broadcast({"type": "chat.delta", "stream_id": self.stream_id, "user": self.user, "delta": delta, **self.extra})
+
+    def finish(self, content: str, ts) -> Dict[str, Any]:
+        self.closed = True
+        return _chat_frame(self.user, content, ts, self.stream_id, **self.extra)
+
+    async def abort(self):
+        if self.started and not self.closed:
+            self.closed = True
+            await self._broadcast(_chat_frame(self.user, "", time.time(), self.stream_id, aborted=True, **self.extra))
+
+
+def _delta_sender(broadcast_fn, stream_id: str, user: str, **extra) -> Optional[_DeltaSender]:
+    """Build an on_delta callback forwarding chat.delta frames, or None when streaming is disabled."""
+    if not settings.LLM_STREAMING:
+        return None
+    return _DeltaSender(broadcast_fn, stream_id, user, **extra)
+
+
+def _chat_frame(user: str, content: str, ts, stream_id: Optional[str] = None, **extra) -> Dict[str, Any]:
+    """Final frame for a reply: chat.done closes a stream, plain chat otherwise."""
+    frame = {"type": "chat", "user": user, "content": content, "ts": ts, **extra}
+    if stream_id is not None:
+        frame["type"] = "chat.done"
+        frame["stream_id"] = stream_id
+    return frame
+
+
+# Quick keyword check for obvious moral questions - BUT only as a hint, not automatic trigger.
+# The LLM's YES only counts alongside one of these, so they double as a cheap pre-filter.
+MORAL_KEYWORDS = ['cheating', 'betray', 'lie to', 'lying to', 'steal', 'hurt someone',
+                  'ghost someone', 'break up', 'fire someone', 'tell the truth']
+MORAL_PHRASES = ['should i tell', 'is it okay to', 'is it right to']
+# One compiled alternation: a single pass over the message instead of one scan per keyword
+_MORAL_TRIGGER_RE = re.compile("|".join(re.escape(k) for k in MORAL_KEYWORDS + MORAL_PHRASES), re.IGNORECASE)
+
+MORAL_DETECTOR_STATS = {
+    "checked": 0,
+    "cheap_rejected": 0,  # decided without an upstream call
+    "cheap_passed": 0,
+    "llm_calls": 0,
+    "llm_yes": 0,
+    "llm_no": 0,
+    "llm_errors": 0,
+}
+
+
+@stage_timer("detect_moral_dilemma")
 async def detect_moral_dilemma(client: httpx.AsyncClient, room: RoomState, message: str) -> bool:
-    """Ask the LLM briefly whether the user's message contains a moral/ethical dilemma.
+    """Decide whether the user's message contains a moral/ethical dilemma.
 
-    Returns True if the model indicates a moral dilemma (YES).
+    Cheap stage first: messages without a moral trigger phrase are rejected locally. Only
+    the rest are sent to the LLM, and True is returned if the model answers YES.
     """
-    # Quick keyword check for obvious moral questions - BUT only as a hint, not automatic trigger
-    moral_keywords = ['cheating', 'betray', 'lie to', 'lying to', 'steal', 'hurt someone', 
-                      'ghost someone', 'break up', 'fire someone', 'tell the truth']
-    message_lower = message.lower()
-    has_strong_keyword = any(kw in message_lower for kw in moral_keywords)
-    
+    MORAL_DETECTOR_STATS["checked"] += 1
+
+    # Stage 1: cheap trigger match. A positive answer needs a trigger anyway, so without
+    # one the LLM is never consulted.
+    trigger = _MORAL_TRIGGER_RE.search(message)
+    if trigger is None:
+        MORAL_DETECTOR_STATS["cheap_rejected"] += 1
+        return False
+    MORAL_DETECTOR_STATS["cheap_passed"] += 1
+
+    # Stage 2: LLM confirms the trigger really is a deep moral question
     # Stricter prompt - require DEEP moral implications
     prompt = f"""Is this question a DEEPLY MORAL or ETHICAL dilemma that involves right vs wrong, harm to others, or serious ethical consequences?
 
@@ -39,49 +141,49 @@ Examples that are NOT moral dilemmas:
 - "Should I study or watch TV?" (personal decision)
 
 User's question:
-{message}
+{clip(message)}
 
 Does this question involve serious ethical implications, potential harm to others, or deeply moral consequences that warrant debate between 'Good' and 'Evil' perspectives?
 
 Answer ONLY: YES or NO
 """
     try:
-        print(f"[DEBUG] Checking if DEEPLY moral dilemma: '{message[:100]}'...")
+        log.debug("Checking if DEEPLY moral dilemma: %r", message[:100])
+        MORAL_DETECTOR_STATS["llm_calls"] += 1
         resp = await chat(
             client=client,
             messages=[{"role": "user", "content": prompt}],
             params={"temperature": 0.0, "max_tokens": 10},
             stream=False,
+            priority=PRIORITY_GATING,
+            room_id=room.id,
+            hedge=True,
         )
         if isinstance(resp, dict):
             text = resp.get("choices", [{}])[0].get("message", {}).get("content", "NO").strip().upper()
             is_moral = "YES" in text
+            MORAL_DETECTOR_STATS["llm_yes" if is_moral else "llm_no"] += 1
             
-            # Only use keyword as additional confirmation, not sole trigger
-            final_decision = is_moral and (has_strong_keyword or "should i tell" in message_lower or "is it okay to" in message_lower or "is it right to" in message_lower)
-            
-            print(f"[DEBUG] Moral dilemma detection: LLM='{text}', strong_keyword={has_strong_keyword} -> {final_decision}")
-            return final_decision
+            log.debug("Moral dilemma detection: LLM=%r, trigger=%r -> %s", text, trigger.group(0), is_moral)
+            return is_moral
     except Exception as e:
-        print(f"[ERROR] detect_moral_dilemma failed: {e}")
-        import traceback
-        traceback.print_exc()
+        MORAL_DETECTOR_STATS["llm_errors"] += 1
+        log.exception("detect_moral_dilemma failed: %s", e)
         return False
     return False
 
 
+@stage_timer("debate_agent")
 async def call_agent_and_broadcast(client: httpx.AsyncClient, agent_persona, room: RoomState, user_message: str, broadcast_fn):
     """Call the LLM as a specific agent persona and broadcast the plain-text reply."""
     sys = render_system(agent_persona, room.memory)
-    user_prompt = f"User asked: {user_message}\n\nProvide a concise (1-3 sentence) argument from your persona's perspective. Keep it short and clear. DO NOT respond with JSON - just plain text." 
+    user_prompt = f"User asked: {clip(user_message)}\n\nProvide a concise (1-3 sentence) argument from your persona's perspective. Keep it short and clear. DO NOT respond with JSON - just plain text." 
+    pack("debate", [sys, user_prompt])
     messages = [{"role": "system", "content": sys}, {"role": "user", "content": user_prompt}]
+    stream_id = str(uuid.uuid4())
+    on_delta = _delta_sender(broadcast_fn, stream_id, agent_persona.name)
     try:
-        resp = await chat(client=client, messages=messages, params={"temperature": 0.6, "max_tokens": 180}, stream=False)
-        content = None
-        if isinstance(resp, dict):
-            content = resp.get("choices", [])[0].get("message", {}).get("content", "").strip()
-        else:
-            content = str(resp).strip()
+        content = await _complete(client, messages, {"temperature": 0.6, "max_tokens": 180}, on_delta, room_id=room.id)
 
         if content:
             # Try to parse JSON if present (extract "content" field)
@@ -90,36 +192,45 @@ async def call_agent_and_broadcast(client: httpx.AsyncClient, agent_persona, roo
                     parsed = json.loads(content)
                     if isinstance(parsed, dict) and "content" in parsed:
                         content = parsed["content"]
-                        print(f"[DEBUG] Extracted content from JSON: {content}")
+                        log.debug("Extracted content from JSON: %s", content)
             except:
                 pass  # Use raw content if not JSON
             
             # append to room state and broadcast
             room.append_message(agent_persona.name, "assistant", content)
-            await broadcast_fn({"type": "chat", "user": agent_persona.name, "content": content, "ts": time.time()})
+            ts = time.time()
+            await broadcast_fn(on_delta.finish(content, ts) if on_delta else _chat_frame(agent_persona.name, content, ts))
+            BOT_REPLIES.inc(bot=agent_persona.name)
         return content
     except Exception as e:
-        print(f"[ERROR] call_agent failed for {agent_persona.name}: {e}")
+        log.error("call_agent failed for %s: %s", agent_persona.name, e)
         return None
+    finally:
+        if on_delta:
+            await on_delta.abort()
 
 
+@stage_timer("debate")
 async def handle_moral_dilemma(client: httpx.AsyncClient, room: RoomState, user_message: str, broadcast_fn):
     """Orchestrate a short debate between GoodBot and EvilBot, then have the main bot synthesize a final answer."""
-    print(f"[DEBUG] Handling moral dilemma for message: {user_message}")
+    log.debug("Handling moral dilemma for message: %s", user_message)
     # 1. Notify chat
     await broadcast_fn({"type": "system", "event": "debate.start", "message": "Debate mode: GoodBot vs EvilBot"})
 
-    # 2. GoodBot speaks
+    # 2. GoodBot and EvilBot argue concurrently: neither sees the other's argument, so each
+    # reply is broadcast (under its own name) as soon as it is ready, whichever comes first
     good = MORAL_AGENTS.get("GoodBot")
     evil = MORAL_AGENTS.get("EvilBot")
-    good_resp = await call_agent_and_broadcast(client, good, room, user_message, broadcast_fn)
 
-    # 3. EvilBot speaks
-    evil_resp = await call_agent_and_broadcast(client, evil, room, user_message, broadcast_fn)
+    async def _argue(agent):
+        with span("debate_agent", agent=agent.name):
+            return await call_agent_and_broadcast(client, agent, room, user_message, broadcast_fn)
 
-    # 4. Main bot synthesizes
+    good_resp, evil_resp = await asyncio.gather(_argue(good), _argue(evil))
+
+    # 3. Main bot synthesizes once both arguments are in
     synth_prompt = f"""
-User asked: {user_message}
+User asked: {clip(user_message)}
 
 GoodBot argued: {good_resp}
 EvilBot argued: {evil_resp}
@@ -128,14 +239,13 @@ As the balanced assistant, synthesize these perspectives into one concise recomm
 """
     # Use the room's persona for final synthesis
     sys = render_system(room.persona, room.memory)
+    pack("debate", [sys, synth_prompt])
     messages = [{"role": "system", "content": sys}, {"role": "user", "content": synth_prompt}]
+    stream_id = str(uuid.uuid4())
+    on_delta = _delta_sender(broadcast_fn, stream_id, room.persona.name)
     try:
-        res = await chat(client=client, messages=messages, params={"temperature": 0.5, "max_tokens": 220}, stream=False)
-        final = None
-        if isinstance(res, dict):
-            final = res.get("choices", [])[0].get("message", {}).get("content", "").strip()
-        else:
-            final = str(res).strip()
+        with STAGE_SECONDS.time(stage="debate_synthesis"), span("debate_synthesis"):
+            final = await _complete(client, messages, {"temperature": 0.5, "max_tokens": 220}, on_delta, room_id=room.id)
 
         if final:
             # Parse JSON if present (extract "content" field)
@@ -144,16 +254,21 @@ As the balanced assistant, synthesize these perspectives into one concise recomm
                     parsed = json.loads(final)
                     if isinstance(parsed, dict) and "content" in parsed:
                         final = parsed["content"]
-                        print(f"[DEBUG] Extracted synthesis content from JSON: {final}")
+                        log.debug("Extracted synthesis content from JSON: %s", final)
             except:
                 pass  # Use raw content if not JSON
             
             room.append_message(room.persona.name, "assistant", final)
             room.last_ai_ts = time.time()
             room.consecutive_ai += 1
-            await broadcast_fn({"type": "chat", "user": room.persona.name, "content": final, "ts": time.time()})
+            ts = time.time()
+            await broadcast_fn(on_delta.finish(final, ts) if on_delta else _chat_frame(room.persona.name, final, ts))
+            BOT_REPLIES.inc(bot=room.persona.name)
     except Exception as e:
-        print(f"[ERROR] synthesis failed: {e}")
+        log.error("synthesis failed: %s", e)
+    finally:
+        if on_delta:
+            await on_delta.abort()
 
 
 async def should_ai_respond(client: httpx.AsyncClient, room: RoomState) -> bool:
@@ -162,7 +277,7 @@ async def should_ai_respond(client: httpx.AsyncClient, room: RoomState) -> bool:
     
     # Basic safety check - don't spam
     if not room.can_speak(now, room.persona.talkativeness.max_consecutive_ai_msgs):
-        print(f"[DEBUG] can_speak returned False - cooldown active")
+        log.debug("can_speak returned False - cooldown active")
         return False
     
     # Get recent conversation context (last 5 messages)
@@ -198,7 +313,7 @@ Should {room.persona.name} respond now? Consider:
 Answer ONLY with: YES or NO"""
 
     try:
-        print(f"[DEBUG] Asking LLM if bot should respond...")
+        log.debug("Asking LLM if bot should respond...")
         
         # Use minimal params for quick decision
         decision_params = {
@@ -210,7 +325,10 @@ Answer ONLY with: YES or NO"""
             client=client,
             messages=[{"role": "user", "content": decision_prompt}],
             params=decision_params,
-            stream=False
+            stream=False,
+            priority=PRIORITY_GATING,
+            room_id=room.id,
+            hedge=True,
         )
         
         # chat() returns Dict when stream=False
@@ -218,16 +336,14 @@ Answer ONLY with: YES or NO"""
             decision_text = response.get("choices", [{}])[0].get("message", {}).get("content", "NO").strip().upper()
             should_respond = "YES" in decision_text
             
-            print(f"[DEBUG] LLM decision: {decision_text} -> {should_respond}")
+            log.debug("LLM decision: %s -> %s", decision_text, should_respond)
             return should_respond
         else:
-            print(f"[ERROR] Unexpected response type: {type(response)}")
+            log.error("Unexpected response type: %s", type(response))
             return False
         
     except Exception as e:
-        print(f"[ERROR] LLM decision failed: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("LLM decision failed: %s", e)
         # Fallback to simple mention check
         last_msg = recent_messages[-1] if recent_messages else None
         if last_msg:
@@ -235,22 +351,25 @@ Answer ONLY with: YES or NO"""
         return False
 
 
+@stage_timer("extract_facts")
 async def extract_facts(client: httpx.AsyncClient, room: RoomState, recent_messages: List[ChatMessage]) -> Dict[str, str]:
-    """Use LLM to extract facts about users from recent conversation."""
+    """Use LLM to extract facts about users from the given (new) messages.
+
+    Messages that don't fit one prompt under the facts budget are split into several
+    calls (run concurrently, merged oldest first), so every message handed over is read
+    exactly once.
+    """
     if not recent_messages:
         return {}
     
-    # Format recent conversation
-    conversation = "\n".join([
-        f"{msg.user}: {msg.content}" for msg in recent_messages[-10:]
-    ])
-    
-    # Get current known facts
+    # Known facts, only for the people who speak in these messages
+    speakers = {msg.user for msg in recent_messages}
     current_facts = "\n".join([
-        f"- {user}: {facts}" for user, facts in room.memory.per_user.items()
+        f"- {user}: {facts}" for user, facts in room.memory.per_user.items() if user in speakers
     ]) or "None yet"
     
-    extraction_prompt = f"""Analyze this conversation and extract key facts about each person.
+    def _prompt(conversation: str) -> str:
+        return f"""Analyze this conversation and extract key facts about each person.
 
 Current known facts:
 {current_facts}
@@ -271,13 +390,51 @@ Format:
 If no new facts to extract, respond with exactly: {{}}
 """
 
+    # Split the new messages into oldest-first runs that each fit the facts budget
+    index = TokenIndex(recent_messages)
+    room_left = budget_for("facts") - estimate_tokens(_prompt(""))
+    conversations = []
+    start = 0
+    while start < len(recent_messages):
+        stop = max(start + 1, index.head_end(start, len(recent_messages), room_left, LINE_OVERHEAD))
+        chunk = recent_messages[start:stop]
+        packed = pack("facts", [_prompt("")], chunk)
+        conversations.append(packed.text if packed.items else as_line(chunk[-1], clip(chunk[-1].content)))
+        start = stop
+    results = await asyncio.gather(*(_request_facts(client, room, _prompt(c)) for c in conversations))
+    facts: Dict[str, Any] = {}
+    for result in results:
+        facts = _merge_facts(facts, result)
+    return facts
+
+
+def _merge_facts(earlier: Dict[str, Any], later: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two extraction results; later facts come last, so they are merged last."""
+    merged = dict(earlier)
+    if not isinstance(later, dict):
+        return merged
+    for user, facts in later.items():
+        if isinstance(facts, list):
+            facts = ", ".join(str(f) for f in facts)
+        if user in merged:
+            prev = merged[user]
+            prev = ", ".join(str(f) for f in prev) if isinstance(prev, list) else prev
+            merged[user] = f"{prev}, {facts}"
+        else:
+            merged[user] = facts
+    return merged
+
+
+async def _request_facts(client: httpx.AsyncClient, room: RoomState, extraction_prompt: str) -> Dict[str, Any]:
     try:
-        print(f"[DEBUG] Extracting facts from conversation...")
+        log.debug("Extracting facts from conversation...")
         response = await chat(
             client=client,
             messages=[{"role": "user", "content": extraction_prompt}],
             params={"temperature": 0.2, "max_tokens": 300},
-            stream=False
+            stream=False,
+            priority=PRIORITY_FACTS,
+            room_id=room.id,
         )
         
         if isinstance(response, dict):
@@ -285,11 +442,11 @@ If no new facts to extract, respond with exactly: {{}}
             
             # Handle empty or whitespace-only content
             if not content or not content.strip():
-                print(f"[DEBUG] LLM returned empty content for fact extraction")
+                log.debug("LLM returned empty content for fact extraction")
                 return {}
             
             content = content.strip()
-            print(f"[DEBUG] Raw fact extraction response: {content[:200]}")
+            log.debug("Raw fact extraction response: %s", content[:200])
             
             # Try to extract JSON from markdown code blocks if present
             if "```json" in content:
@@ -306,16 +463,14 @@ If no new facts to extract, respond with exactly: {{}}
             # Try to parse JSON
             try:
                 facts_data = json.loads(content)
-                print(f"[DEBUG] Extracted facts: {facts_data}")
+                log.debug("Extracted facts: %s", facts_data)
                 return facts_data
             except json.JSONDecodeError as je:
-                print(f"[ERROR] JSON parse failed: {je}. Content was: {content[:200]}")
+                log.error("JSON parse failed: %s. Content was: %s", je, content[:200])
                 return {}
         
     except Exception as e:
-        print(f"[ERROR] Fact extraction failed: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Fact extraction failed: %s", e)
     
     return {}
 
@@ -324,15 +479,19 @@ async def build_messages(room: RoomState) -> List[Dict[str, Any]]:
     # system
     sys = render_system(room.persona, room.memory)
     messages: List[Dict[str, Any]] = [{"role": "system", "content": sys}]
-    tail = room.tail_by_tokens(8000)
-    for m in tail:
+    # Older messages are already in the system prompt's summary; the packer keeps the
+    # newest live ones that fit the generation budget
+    packed = pack(
+        "generation", [sys], room.history,
+        fmt=lambda m, content: f"{m.user}: {content}" if m.role == "user" else content,
+        overhead=MESSAGE_OVERHEAD, floor=room.summarized_upto, index=room.token_index(),
+    )
+    for m, content in packed.items:
         role = m.role
-        content = m.content
         # CRITICAL: Show clear speaker attribution in messages
         if role == "user":
-            # Format: "username: message content" for crystal clear attribution
-            formatted_content = f"{m.user}: {content}"
-            messages.append({"role": "user", "content": formatted_content})
+            # Format: "username: message content" for crystal clear attribution (done by the packer)
+            messages.append({"role": "user", "content": content})
         else:
             # Bot's own messages
             messages.append({"role": "assistant", "content": content})
@@ -342,21 +501,62 @@ async def build_messages(room: RoomState) -> List[Dict[str, Any]]:
 async def call_llm(client, room: RoomState, params: LLMParams, stream: bool = False):
     messages = await build_messages(room)
     p = params.model_dump() if hasattr(params, "model_dump") else params.dict()
-    res = await chat(client, messages, p, stream=stream)
+    res = await chat(client, messages, p, stream=stream, room_id=room.id)
     return res
 
 
+_CODE_FENCE_RE = re.compile(r"^```[\w-]*\s*\n?(.*?)\n?```\s*$", re.DOTALL)
+
+
+def _json_object(obj: Any) -> Optional[Dict[str, Any]]:
+    """The JSON object in a model answer: a dict as-is, or parsed out of text.
+
+    Models wrap structured answers in ```json fences or put a sentence around them, so when
+    the whole text is not JSON the first decodable {...} in it is used.
+    """
+    if isinstance(obj, dict):
+        return obj
+    if not isinstance(obj, str):
+        return None
+    text = obj.strip()
+    fenced = _CODE_FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        j = json.loads(text)
+        return j if isinstance(j, dict) else None
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start >= 0:
+        try:
+            j, _ = decoder.raw_decode(text, start)
+            if isinstance(j, dict):
+                return j
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+
 def parse_structured(obj: Any) -> Optional[LLMStructuredResponse]:
+    j = _json_object(obj)
+    if j is None:
+        return None
+    # Forgive the usual slips: a missing speak_now next to content, null content, bare strings for lists
+    j = dict(j)
+    if j.get("content") is None:
+        j["content"] = ""
+    if "speak_now" not in j:
+        j["speak_now"] = bool(str(j["content"]).strip())
+    for key in ("address", "moderation_flags"):
+        if isinstance(j.get(key), str):
+            j[key] = [j[key]] if j[key] else []
     try:
-        if isinstance(obj, dict):
-            return LLMStructuredResponse(**obj)
-        if isinstance(obj, str):
-            # try parse JSON
-            j = json.loads(obj)
-            return LLMStructuredResponse(**j)
+        return LLMStructuredResponse(**j)
     except Exception:
         return None
-    return None
 
 
 async def apply_structured_response(client: httpx.AsyncClient, resp_obj: Any, room: RoomState, broadcast_fn):
@@ -369,10 +569,10 @@ async def apply_structured_response(client: httpx.AsyncClient, resp_obj: Any, ro
         content = parsed.content
         # memory update
         if parsed.memory_update:
-            room.memory.per_user[room.persona.name] = parsed.memory_update
+            room.memory.set_user_note(room.persona.name, parsed.memory_update)
     else:
         # Fallback: treat as plain text response
-        print(f"[DEBUG] Structured parse failed, using raw content as fallback")
+        log.debug("Structured parse failed, using raw content as fallback")
         if isinstance(resp_obj, str):
             content = resp_obj.strip()
         else:
@@ -380,7 +580,7 @@ async def apply_structured_response(client: httpx.AsyncClient, resp_obj: Any, ro
             content = str(resp_obj).strip()
         
         if not content:
-            print(f"[DEBUG] No content to broadcast")
+            log.debug("No content to broadcast")
             return
     
     # Broadcast the message
@@ -390,57 +590,418 @@ async def apply_structured_response(client: httpx.AsyncClient, resp_obj: Any, ro
     
     await broadcast_fn({"type": "chat", "user": room.persona.name, "content": content, "ts": time.time()})
     
-    # AFTER responding, extract facts from recent conversation
+    # Fact extraction runs in the background, off the reply path
+    if room.facts is not None:
+        room.facts.notify()
+
+
+async def extract_and_store_facts(client: httpx.AsyncClient, room: RoomState, messages: List[ChatMessage]):
+    """Extract facts from new messages and merge them into the room memory (FactJob body)."""
     try:
-        recent_msgs = room.history[-10:] if len(room.history) >= 10 else room.history
-        extracted_facts = await extract_facts(client, room, recent_msgs)
+        extracted_facts = await extract_facts(client, room, messages)
         
-        # Merge extracted facts into existing memory
+        # Merge extracted facts into the deduplicated, size-capped fact store
         for user, new_facts in extracted_facts.items():
-            if user in room.memory.per_user:
-                # Append to existing facts
-                existing = room.memory.per_user[user]
-                room.memory.per_user[user] = f"{existing}, {new_facts}"
-            else:
-                # Create new entry
-                room.memory.per_user[user] = new_facts
+            if isinstance(new_facts, list):
+                new_facts = ", ".join(str(f) for f in new_facts)
+            room.memory.add_user_facts(user, str(new_facts))
         
         if extracted_facts:
-            print(f"[DEBUG] Updated memory with facts: {extracted_facts}")
+            log.debug("Updated memory with facts: %s", extracted_facts)
     except Exception as e:
-        print(f"[ERROR] Failed to extract/store facts: {e}")
+        log.error("Failed to extract/store facts: %s", e)
 
 
-async def should_bot_respond(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str) -> bool:
-    """Determine if this specific bot should respond to the user's message based on its personality and the context."""
-    
-    # Always respond if directly mentioned (check @ mention or any part of their name)
-    user_message_lower = user_message.lower()
-    
+def mention_position(bot_persona: PersonaConfig, user_message: str) -> Optional[int]:
+    """Return the index of the first mention of this bot in the message, or None if not mentioned."""
     # Check for @ mention with full name
-    if f"@{bot_persona.name}" in user_message:
-        return True
-    
+    pos = user_message.find(f"@{bot_persona.name}")
+    if pos >= 0:
+        return pos
+
     # Split name into parts and check if ANY part is mentioned
     # e.g., "Sasuke Uchiha" -> ["sasuke", "uchiha"]
-    name_parts = bot_persona.name.lower().split()
-    for part in name_parts:
+    user_message_lower = user_message.lower()
+    hits = [
+        user_message_lower.find(part)
+        for part in bot_persona.name.lower().split()
         # Only check name parts that are at least 3 characters (avoid false matches on short words)
-        if len(part) >= 3 and part in user_message_lower:
-            print(f"[DEBUG] Bot {bot_persona.name} mentioned via name part: '{part}'")
-            return True
+        if len(part) >= 3 and part in user_message_lower
+    ]
+    return min(hits) if hits else None
+
+
+def order_bots(bot_ids: List[str], user_message: str, order: Optional[str] = None) -> List[str]:
+    """Return the known bots among bot_ids in a deterministic reply order.
+
+    - "registry": declaration order of BOT_PERSONAS
+    - "name": alphabetical by persona name
+    - "mention": bots mentioned in the message first (in order of mention), then registry order
+    """
+    order = order or settings.BOT_REPLY_ORDER
+    registry = [b for b in BOT_PERSONAS if b in bot_ids]
+    if order == "name":
+        return sorted(registry, key=lambda b: BOT_PERSONAS[b].name.lower())
+    if order == "mention":
+        positions = {b: mention_position(BOT_PERSONAS[b], user_message) for b in registry}
+        mentioned = sorted((b for b in registry if positions[b] is not None), key=lambda b: positions[b])
+        return mentioned + [b for b in registry if positions[b] is None]
+    return registry
+
+
+async def _gate_and_generate(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str,
+                             on_delta: Optional[Callable[[str], Awaitable[Any]]] = None) -> Optional[str]:
+    """Run the YES/NO gate for one bot and, if it passes, generate its reply.
+
+    Bots that usually say YES (see speculation) start generating at the same time as the
+    gate; the generation is cancelled, or its result discarded, if the gate says NO.
+    """
+    name = bot_persona.name
+    mentioned = mention_position(bot_persona, user_message) is not None
+    if not mentioned and speculation.should_speculate(name):
+        return await _speculative_gate_and_generate(client, room, bot_persona, user_message, on_delta)
+
+    enter_stage("gating")
+    with span("gate", bot=name):
+        should_respond = await should_bot_respond(client, room, bot_persona, user_message)
+    if not mentioned:
+        speculation.record_gate(name, should_respond)
+    log.debug("%s should_respond: %s", name, should_respond)
+    if not should_respond:
+        return None
+    enter_stage("generation")
+    with span("generate", bot=name):
+        return await call_bot_llm(client, room, bot_persona, user_message, on_delta)
+
+
+async def _speculative_gate_and_generate(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str,
+                                         on_delta: Optional[Callable[[str], Awaitable[Any]]] = None) -> Optional[str]:
+    name = bot_persona.name
+    # Streamed deltas are held back until the gate says YES
+    held = HeldDeltas(on_delta) if on_delta is not None else None
+    enter_stage("speculative")
+    # Its own job state: the gate being sent must not make a still-queued generation look sent
+    generation = spawn(call_bot_llm(client, room, bot_persona, user_message, held.send if held else None), "generation")
+    try:
+        enter_stage("gating")
+        with span("gate", bot=name, speculative=True):
+            should_respond = await should_bot_respond(client, room, bot_persona, user_message)
+        speculation.record_gate(name, should_respond)
+        speculation.record_speculation(name, hit=should_respond)
+        log.debug("%s should_respond: %s (speculative)", name, should_respond)
+        if not should_respond:
+            return None
+        with span("generate", bot=name, speculative=True):
+            if held is not None:
+                await held.release()
+            return await generation
+    finally:
+        if not generation.done():
+            generation.cancel()
+
+
+async def _combined_reply(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str,
+                          on_delta: Optional[Callable[[str], Awaitable[Any]]] = None) -> Optional[str]:
+    """BOT_ROUTING_MODE=combined: one call per bot that decides speak_now and writes the reply."""
+    name = bot_persona.name
+    if mention_position(bot_persona, user_message) is not None:
+        # A mentioned bot always speaks, so the plain (streamable) generation is already one call
+        BOT_GATE_DECISIONS.inc(bot=name, decision="mention")
+        enter_stage("generation")
+        with span("generate", bot=name):
+            return await call_bot_llm(client, room, bot_persona, user_message, on_delta)
+
+    enter_stage("combined")
+    with span("combined", bot=name):
+        content = await call_bot_structured(client, room, bot_persona, user_message)
+    BOT_GATE_DECISIONS.inc(bot=name, decision="yes" if content else "no")
+    speculation.record_gate(name, content is not None)
+    log.debug("%s speak_now: %s (combined)", name, content is not None)
+    return content
+
+
+BOT_ROUTING_STATS = {
+    "batched": {
+        "rounds": 0,
+        "parsed": 0,
+        "fallbacks": 0,  # unparseable answer: the round went back to per-bot gate + generation
+        "backfills": 0,  # mentioned bot left out of the answer, generated on its own
+        "entry_fallbacks": 0,  # one bot's entry was malformed: that bot alone went per-bot
+    },
+    "combined": {
+        "calls": 0,
+        "spoke": 0,
+        "silent": 0,
+        "unparsed": 0,  # not JSON: plain text is taken as the reply, anything else as silence
+    },
+}
+
+
+def parse_batched(obj: Any) -> Optional[BatchedBotReplies]:
+    """Parse the batched answer entry by entry: one malformed bot doesn't sink the others.
+
+    Entries get the same leniency as parse_structured (speak_now inferred from content, null
+    content); an entry that still doesn't validate is listed in `invalid` by its bot_id.
+    """
+    j = _json_object(obj)
+    if j is None or not isinstance(j.get("replies"), list):
+        return None
+    parsed = BatchedBotReplies()
+    for entry in j["replies"]:
+        if not isinstance(entry, dict):
+            continue
+        entry = dict(entry)
+        if entry.get("content") is None:
+            entry["content"] = ""
+        if "speak_now" not in entry:
+            entry["speak_now"] = bool(str(entry["content"]).strip())
+        try:
+            parsed.replies.append(BotReply(**entry))
+        except Exception:
+            if isinstance(entry.get("bot_id"), str):
+                parsed.invalid.append(entry["bot_id"])
+    return parsed
+
+
+def _batched_persona(bot_id: str, bot_persona: PersonaConfig) -> str:
+    emojis = "allowed sparingly" if bot_persona.emoji_ok else "FORBIDDEN"
+    return f"""- bot_id "{bot_id}": {bot_persona.name}
+  Personality: {bot_persona.backstory}
+  Tone: {bot_persona.tone}; formality: {bot_persona.formality}; emojis: {emojis}"""
+
+
+@stage_timer("batched_bot_replies")
+async def batched_bot_replies(client: httpx.AsyncClient, room: RoomState, bot_ids: List[str], user_message: str) -> Optional[Dict[str, Optional[str]]]:
+    """Decide and write every active bot's reply in one structured call (BOT_ROUTING_MODE=batched).
+
+    Returns bot_id -> reply for the bots that speak, with None for bots whose entry was
+    malformed (they fall back to per-bot calls); bots left out stay quiet. Returns None
+    altogether if the answer can't be parsed.
+    """
+    BOT_ROUTING_STATS["batched"]["rounds"] += 1
+    mentioned = [b for b in bot_ids if mention_position(BOT_PERSONAS[b], user_message) is not None]
+    personas = "\n".join(_batched_persona(b, BOT_PERSONAS[b]) for b in bot_ids)
+    profiles = "\n".join(f"- {user}: {note}" for user, note in room.memory.per_user.items())
+    must_speak = ", ".join(f'"{b}"' for b in mentioned) or "none"
+    latest = clip(user_message)
+
+    def _prompt(context: str) -> str:
+        return f"""You are writing for several AI characters in a multi-user group chat. Each stays in character.
+
+Characters:
+{personas}
+
+Conversation summary: {room.memory.summary}
+
+User profiles (remember these facts):
+{profiles}
+
+Recent conversation:
+{context}
+
+Latest message: {latest}
+
+For each character decide whether they should respond to the latest message. Only respond when it
+is relevant to their personality or expertise or they are asked something; not every character
+should speak every time. Characters mentioned in the message MUST speak: {must_speak}.
+Replies are conversational, 2-4 sentences, in that character's voice; address people by @name when relevant.
+
+Respond ONLY with JSON:
+{{"replies": [{{"bot_id": "<bot_id>", "speak_now": true|false, "content": "reply if speak_now"}}]}}"""
+
+    packed = pack("generation", [_prompt("")], room.history, floor=room.summarized_upto, index=room.token_index())
+    prompt = _prompt(packed.text)
+    priority = PRIORITY_MENTION if mentioned else PRIORITY_GENERATION
+    try:
+        content = await _complete(
+            client,
+            [{"role": "user", "content": prompt}],
+            {"temperature": 0.7, "max_tokens": 200 * len(bot_ids)},
+            priority=priority,
+            room_id=room.id,
+        )
+    except Exception as e:
+        log.error("Batched bot round failed: %s", e)
+        BOT_ROUTING_STATS["batched"]["fallbacks"] += 1
+        return None
+
+    parsed = parse_batched(content)
+    if parsed is None:
+        log.debug("Batched bot answer not parseable, falling back to per-bot calls")
+        BOT_ROUTING_STATS["batched"]["fallbacks"] += 1
+        return None
+    BOT_ROUTING_STATS["batched"]["parsed"] += 1
+    # The model sometimes answers with the character's name instead of the id
+    by_name = {BOT_PERSONAS[b].name.lower(): b for b in bot_ids}
+    def _resolve(bot_ref: str) -> Optional[str]:
+        return bot_ref if bot_ref in bot_ids else by_name.get(bot_ref.lower())
+
+    replies: Dict[str, Optional[str]] = {}
+    for bot_ref in parsed.invalid:
+        bot_id = _resolve(bot_ref)
+        if bot_id:
+            replies[bot_id] = None
+    for r in parsed.replies:
+        bot_id = _resolve(r.bot_id)
+        if not bot_id:
+            continue
+        if r.speak_now and r.content.strip():
+            replies[bot_id] = r.content.strip()
+        elif replies.get(bot_id, "") is None:
+            del replies[bot_id]  # a valid entry for the same bot wins over a malformed one
+    BOT_ROUTING_STATS["batched"]["entry_fallbacks"] += sum(1 for v in replies.values() if v is None)
+    return replies
+
+
+async def _from_batch(batch: "asyncio.Task[Optional[Dict[str, Optional[str]]]]", client: httpx.AsyncClient, room: RoomState,
+                      bot_id: str, user_message: str,
+                      on_delta: Optional[Callable[[str], Awaitable[Any]]] = None) -> Optional[str]:
+    """One bot's reply out of the shared batched answer, or per-bot calls if there is none."""
+    bot_persona = BOT_PERSONAS[bot_id]
+    name = bot_persona.name
+    enter_stage("batched")
+    # Shielded: preempting this bot must not cancel the answer the other bots are waiting on
+    replies = await asyncio.shield(batch)
+    if replies is None or (bot_id in replies and replies[bot_id] is None):
+        return await _gate_and_generate(client, room, bot_persona, user_message, on_delta)
+
+    content = replies.get(bot_id)
+    if mention_position(bot_persona, user_message) is not None:
+        BOT_GATE_DECISIONS.inc(bot=name, decision="mention")
+        if content is None:
+            BOT_ROUTING_STATS["batched"]["backfills"] += 1
+            enter_stage("generation")
+            with span("generate", bot=name):
+                return await call_bot_llm(client, room, bot_persona, user_message, on_delta)
+        return content
+
+    BOT_GATE_DECISIONS.inc(bot=name, decision="yes" if content else "no")
+    speculation.record_gate(name, content is not None)
+    return content
+
+
+async def run_bot_round(client: httpx.AsyncClient, room: RoomState, user_message: str, broadcast_fn,
+                        fanout: Optional[bool] = None, human_seq: Optional[int] = None):
+    """Let each active bot autonomously decide whether to reply to user_message, and broadcast the replies.
+
+    With fan-out enabled, gating and generation for all bots run concurrently, so the last
+    reply lands after roughly one round-trip instead of N. Replies are still broadcast one at
+    a time in order_bots() order, at least BOT_REPLY_SPACING_SEC apart; pacing only delays
+    the broadcast, never the upstream calls of the bots that come later.
+
+    With BOT_ROUTING_MODE=batched a single structured call decides and writes for all bots
+    (see batched_bot_replies); with "combined" each bot gets one structured call that both
+    decides and writes (see call_bot_structured). Replies are delivered the same way.
+
+    The round is registered with room.rounds as answering human message number human_seq;
+    bots still working when newer messages make it stale are cancelled (see RoundTracker).
+    """
+    fanout = settings.BOT_FANOUT if fanout is None else fanout
+    bot_ids = order_bots(list(room.active_bots), user_message)
+    log.debug("Bot round (%s): %s", "fan-out" if fanout else "sequential", bot_ids)
+    rnd = room.rounds.begin(
+        human_seq,
+        spared=[b for b in bot_ids if mention_position(BOT_PERSONAS[b], user_message) is not None],
+    )
+
+    # With streaming, deltas go out as soon as they are generated; only chat.done follows the reply order
+    senders = {
+        b: _delta_sender(broadcast_fn, str(uuid.uuid4()), BOT_PERSONAS[b].name, is_bot=True, bot_id=b)
+        for b in bot_ids
+    }
+
+    async def _abort(bot_id: str):
+        if senders[bot_id]:
+            await senders[bot_id].abort()
+    batch = None
+    if settings.BOT_ROUTING_MODE == "batched" and bot_ids:
+        # One call answers for every bot; each job just picks its share (and falls back on its own)
+        batch = asyncio.create_task(batched_bot_replies(client, room, bot_ids, user_message))
+        jobs = (_from_batch(batch, client, room, b, user_message, senders[b]) for b in bot_ids)
+    elif settings.BOT_ROUTING_MODE == "combined":
+        jobs = (_combined_reply(client, room, BOT_PERSONAS[b], user_message, senders[b]) for b in bot_ids)
+    else:
+        jobs = (_gate_and_generate(client, room, BOT_PERSONAS[b], user_message, senders[b]) for b in bot_ids)
+    # Until it starts, a job stands for one unsent call (none when the batched call covers it)
+    pending = [rnd.track(b, job, "batched" if batch is not None else "queued") for b, job in zip(bot_ids, jobs)]
+    if fanout:
+        pending = [asyncio.create_task(job) for job in pending]
+        for b, task in zip(bot_ids, pending):
+            rnd.started(b, task)
+    # Otherwise plain coroutines: each bot only starts once the previous one has been delivered
+
+    loop = asyncio.get_running_loop()
+    last_sent = None
+    try:
+        for i, bot_id in enumerate(bot_ids):
+            if rnd.is_preempted(bot_id):
+                continue
+            job = pending[i]
+            if not isinstance(job, asyncio.Task):
+                # Started as a task so preemption can cancel it without cancelling the round
+                job = pending[i] = asyncio.create_task(job)
+                rnd.started(bot_id, job)
+            try:
+                response = await job
+            except asyncio.CancelledError:
+                if rnd.is_preempted(bot_id):
+                    await _abort(bot_id)
+                    continue
+                raise
+            if not response:
+                await _abort(bot_id)
+                continue
+
+            # Small delay between bots to prevent overwhelming
+            if last_sent is not None:
+                wait = last_sent + settings.BOT_REPLY_SPACING_SEC - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+            # Broadcast bot response with bot name
+            bot_persona = BOT_PERSONAS[bot_id]
+            bot_msg = room.append_message(bot_persona.name, "assistant", response)
+            sender = senders[bot_id]
+            with span("broadcast", bot=bot_persona.name):
+                await broadcast_fn(
+                    sender.finish(response, bot_msg.ts.isoformat()) if sender
+                    else _chat_frame(bot_persona.name, response, bot_msg.ts.isoformat(), is_bot=True, bot_id=bot_id)
+                )
+            BOT_REPLIES.inc(bot=bot_persona.name)
+            last_sent = loop.time()
+    finally:
+        room.rounds.end(rnd)
+        if batch is not None:
+            batch.cancel()
+        for bot_id, job in zip(bot_ids, pending):
+            if isinstance(job, asyncio.Task):
+                job.cancel()
+            else:
+                rnd.close_unstarted(bot_id, job)
+        # Whatever ended the round, no stream a client has seen deltas for is left open
+        for bot_id in bot_ids:
+            await _abort(bot_id)
+
+
+@stage_timer("should_bot_respond")
+async def should_bot_respond(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str) -> bool:
+    """Determine if this specific bot should respond to the user's message based on its personality and the context."""
     
-    # Get recent context
-    recent_msgs = room.tail_by_tokens(2000)[-5:] if len(room.history) > 0 else []
-    context = "\n".join([f"{m.user}: {m.content}" for m in recent_msgs])
+    # Always respond if directly mentioned (check @ mention or any part of their name)
+    if mention_position(bot_persona, user_message) is not None:
+        BOT_GATE_DECISIONS.inc(bot=bot_persona.name, decision="mention")
+        return True
     
+    latest = clip(user_message)
+
     # Ask the bot's persona if it wants to respond
-    prompt = f"""You are {bot_persona.name} with this personality: {bot_persona.backstory}
+    def _prompt(context: str) -> str:
+        return f"""You are {bot_persona.name} with this personality: {bot_persona.backstory}
 
 Recent conversation:
 {context}
 
-Latest message: {user_message}
+Latest message: {latest}
 
 Based on your personality and the conversation context, should you respond to this message?
 Consider:
@@ -450,6 +1011,10 @@ Consider:
 - Don't respond to every message - only when it makes sense for your character
 
 Answer ONLY: YES or NO"""
+
+    # Recent context, as much as the gating budget allows
+    packed = pack("gating", [_prompt("")], room.history, floor=room.summarized_upto, index=room.token_index())
+    prompt = _prompt(packed.text)
     
     try:
         resp = await chat(
@@ -457,30 +1022,41 @@ Answer ONLY: YES or NO"""
             messages=[{"role": "user", "content": prompt}],
             params={"temperature": 0.3, "max_tokens": 10},
             stream=False,
+            priority=PRIORITY_GATING,
+            room_id=room.id,
+            hedge=True,
         )
         if isinstance(resp, dict):
             text = resp.get("choices", [{}])[0].get("message", {}).get("content", "NO").strip().upper()
-            return "YES" in text
+            decision = "YES" in text
+            BOT_GATE_DECISIONS.inc(bot=bot_persona.name, decision="yes" if decision else "no")
+            return decision
     except Exception as e:
-        print(f"[ERROR] should_bot_respond failed for {bot_persona.name}: {e}")
+        log.error("should_bot_respond failed for %s: %s", bot_persona.name, e)
+        BOT_GATE_DECISIONS.inc(bot=bot_persona.name, decision="error")
         return False
+    BOT_GATE_DECISIONS.inc(bot=bot_persona.name, decision="no")
     return False
 
 
-async def call_bot_llm(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str) -> str:
-    """Generate a response from a specific bot persona."""
+@stage_timer("call_bot_llm")
+async def call_bot_llm(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str,
+                       on_delta: Optional[Callable[[str], Awaitable[Any]]] = None) -> str:
+    """Generate a response from a specific bot persona, streaming deltas to on_delta if given."""
     sys = render_system(bot_persona, room.memory)
+    latest = clip(user_message)
     
-    # Get recent conversation context
-    recent_msgs = room.tail_by_tokens(4000)[-10:] if len(room.history) > 0 else []
-    conversation_context = "\n".join([f"{m.user}: {m.content}" for m in recent_msgs])
-    
-    user_prompt = f"""Recent conversation:
+    def _prompt(conversation_context: str) -> str:
+        return f"""Recent conversation:
 {conversation_context}
 
-Latest message: {user_message}
+Latest message: {latest}
 
 Respond naturally in your character. Keep it conversational and engaging (2-4 sentences max). DO NOT use JSON - just speak as {bot_persona.name}."""
+
+    # Recent conversation context, as much as the generation budget allows after the system prompt
+    packed = pack("generation", [sys, _prompt("")], room.history, floor=room.summarized_upto, index=room.token_index())
+    user_prompt = _prompt(packed.text)
     
     messages = [
         {"role": "system", "content": sys},
@@ -488,18 +1064,9 @@ Respond naturally in your character. Keep it conversational and engaging (2-4 se
     ]
     
     try:
-        resp = await chat(
-            client=client,
-            messages=messages,
-            params={"temperature": 0.7, "max_tokens": 200},
-            stream=False,
-        )
-        
-        content = None
-        if isinstance(resp, dict):
-            content = resp.get("choices", [])[0].get("message", {}).get("content", "").strip()
-        else:
-            content = str(resp).strip()
+        # Direct mentions jump the generation queue
+        priority = PRIORITY_MENTION if mention_position(bot_persona, user_message) is not None else PRIORITY_GENERATION
+        content = await _complete(client, messages, {"temperature": 0.7, "max_tokens": 200}, on_delta, priority, room.id)
         
         # Try to extract from JSON if present
         if content:
@@ -513,5 +1080,53 @@ Respond naturally in your character. Keep it conversational and engaging (2-4 se
         
         return content or "..."
     except Exception as e:
-        print(f"[ERROR] call_bot_llm failed for {bot_persona.name}: {e}")
+        log.error("call_bot_llm failed for %s: %s", bot_persona.name, e)
         return f"*{bot_persona.name} seems distracted*"
+
+
+@stage_timer("call_bot_structured")
+async def call_bot_structured(client: httpx.AsyncClient, room: RoomState, bot_persona, user_message: str) -> Optional[str]:
+    """Ask a bot whether to speak and what to say in one structured call; None means it stays quiet."""
+    stats = BOT_ROUTING_STATS["combined"]
+    stats["calls"] += 1
+    sys = render_system(bot_persona, room.memory)
+    latest = clip(user_message)
+
+    def _prompt(conversation_context: str) -> str:
+        return f"""Recent conversation:
+{conversation_context}
+
+Latest message: {latest}
+
+Based on your personality and the conversation context, should you respond to this message?
+Don't respond to every message - only when it is relevant to your personality or expertise, your
+perspective adds value, or someone asks something you're suited to answer.
+If you respond, keep it conversational and engaging (2-4 sentences max), as {bot_persona.name}.
+
+Respond ONLY with JSON: {{"speak_now": true|false, "content": "your message (if speak_now)"}}"""
+
+    packed = pack("generation", [sys, _prompt("")], room.history, floor=room.summarized_upto, index=room.token_index())
+    messages = [
+        {"role": "system", "content": sys},
+        {"role": "user", "content": _prompt(packed.text)}
+    ]
+
+    try:
+        text = await _complete(client, messages, {"temperature": 0.7, "max_tokens": 220}, priority=PRIORITY_GENERATION, room_id=room.id)
+    except Exception as e:
+        log.error("call_bot_structured failed for %s: %s", bot_persona.name, e)
+        stats["silent"] += 1
+        return None
+
+    parsed = parse_structured(text)
+    if parsed is not None:
+        content = parsed.content.strip() if parsed.speak_now else ""
+    else:
+        stats["unparsed"] += 1
+        # The model answered in character but ignored the format: that is still a reply
+        content = "" if "{" in text else text
+    if not content:
+        stats["silent"] += 1
+        return None
+    stats["spoke"] += 1
+    return content
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from .config import settings
+from .log import get_logger
+
+log = get_logger("ownership")
+
+Publish = Callable[[str, Optional[str], Dict], Awaitable[None]]
+
+
+def _score(worker_id: str, room_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{worker_id}/{room_id}".encode(), digest_size=8).digest(), "big")
+
+
+class RoomOwnership:
+    """Assigns every room to exactly one live worker, which alone runs its orchestration.
+
+    Workers announce themselves with a "worker" envelope every WORKER_HEARTBEAT_SEC and are
+    forgotten after WORKER_TIMEOUT_SEC of silence (or at once when they announce leaving).
+    The owner of a room is picked by rendezvous hashing over the live workers, so every
+    worker computes the same owner without coordination, and a worker joining or leaving
+    only moves the rooms it wins or held. With the in-process broker the only live worker
+    is this one and it owns everything.
+    """
+
+    def __init__(self, worker_id: str, publish: Publish):
+        self.worker_id = worker_id
+        self._publish = publish
+        self.workers: Dict[str, float] = {worker_id: time.monotonic()}  # worker id -> last heartbeat
+        self.on_change: Optional[Callable[[], None]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self._announce()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self._announce(leaving=True)
+
+    async def _announce(self, leaving: bool = False):
+        await self._publish("worker", None, {"leaving": leaving})
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(settings.WORKER_HEARTBEAT_SEC)
+            try:
+                await self._announce()
+            except Exception as e:
+                log.error("Worker heartbeat failed: %s", e)
+            self.workers[self.worker_id] = time.monotonic()
+            cutoff = time.monotonic() - settings.WORKER_TIMEOUT_SEC
+            dead = [w for w, seen in self.workers.items() if seen < cutoff and w != self.worker_id]
+            for w in dead:
+                del self.workers[w]
+            if dead:
+                log.info("Workers timed out: %s", dead)
+                self._changed()
+
+    async def on_worker(self, worker_id: str, data: Dict):
+        """Handle another worker's "worker" envelope."""
+        if data.get("leaving"):
+            if self.workers.pop(worker_id, None) is not None:
+                self._changed()
+            return
+        known = worker_id in self.workers
+        self.workers[worker_id] = time.monotonic()
+        if not known:
+            self._changed()
+            # Answer right away so the newcomer doesn't wait a heartbeat to see us
+            await self._announce()
+
+    def _changed(self):
+        log.info("Live workers: %d", len(self.workers))
+        if self.on_change is not None:
+            self.on_change()
+
+    def owner(self, room_id: str) -> str:
+        return max(self.workers, key=lambda w: _score(w, room_id))
+
+    def owns(self, room_id: str) -> bool:
+        return self.owner(room_id) == self.worker_id
+
+    def stats(self) -> Dict:
+        return {"worker_id": self.worker_id, "live_workers": len(self.workers)}
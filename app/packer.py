@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import settings
+from .log import get_logger
+from .metrics import PROMPT_OVER_BUDGET, PROMPT_TOKENS, PROMPT_TRUNCATED
+from .schemas import ChatMessage
+from .tokens import estimate_tokens, truncate_to_tokens
+
+log = get_logger("packer")
+
+
+# Chat-format framing per message (role, separators); one newline per line in a text block
+MESSAGE_OVERHEAD = 4
+LINE_OVERHEAD = 1
+
+
+def budget_for(call_type: str) -> int:
+    """Total prompt budget (tokens) for a call type: generation, gating, debate, facts or summary."""
+    return {
+        "generation": settings.PROMPT_BUDGET_GENERATION,
+        "gating": settings.PROMPT_BUDGET_GATING,
+        "debate": settings.PROMPT_BUDGET_DEBATE,
+        "facts": settings.PROMPT_BUDGET_FACTS,
+        "summary": settings.PROMPT_BUDGET_SUMMARY,
+    }.get(call_type, settings.PROMPT_BUDGET_GENERATION)
+
+
+def clip(text: str, max_tokens: Optional[int] = None) -> str:
+    """Truncate one oversized message (e.g. a large paste) to PROMPT_MAX_MESSAGE_TOKENS."""
+    return truncate_to_tokens(text, settings.PROMPT_MAX_MESSAGE_TOKENS if max_tokens is None else max_tokens)
+
+
+def as_line(m: ChatMessage, content: str) -> str:
+    return f"{m.user}: {content}"
+
+
+class TokenIndex:
+    """Packing cost of every message of a history, with prefix sums to bisect its tail.
+
+    A message costs its content clipped to PROMPT_MAX_MESSAGE_TOKENS, in as_line() form (an
+    upper bound for any fmt that adds no more than the speaker prefix). Both the cost and the
+    clipped text are worked out once, when the message is added.
+    """
+
+    def __init__(self, history: Iterable[ChatMessage] = ()):
+        self.prefix: List[int] = [0]  # prefix[i] = cost of history[:i]
+        self.clipped: Dict[str, str] = {}  # message id -> clipped content, oversized messages only
+        for m in history:
+            self.add(m)
+
+    def __len__(self) -> int:
+        return len(self.prefix) - 1
+
+    def add(self, m: ChatMessage):
+        cost = estimate_tokens(m.content)
+        if cost > settings.PROMPT_MAX_MESSAGE_TOKENS:
+            content = self.clipped[m.id] = clip(m.content)
+            cost = estimate_tokens(content)
+        self.prefix.append(self.prefix[-1] + cost + estimate_tokens(as_line(m, "")))
+
+    def content(self, m: ChatMessage) -> str:
+        return self.clipped.get(m.id, m.content)
+
+    def tail_start(self, end: int, budget: int, overhead: int, floor: int = 0) -> int:
+        """Smallest start >= floor such that messages [start, end) fit in budget, `overhead` each."""
+        prefix = self.prefix
+        target = prefix[end] + overhead * end - budget
+        lo, hi = floor, end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if prefix[mid] + overhead * mid < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def head_end(self, start: int, end: int, budget: int, overhead: int) -> int:
+        """Largest stop <= end such that messages [start, stop) fit in budget, `overhead` each."""
+        prefix = self.prefix
+        target = prefix[start] + overhead * start + budget
+        lo, hi = start, end
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if prefix[mid] + overhead * mid > target:
+                hi = mid - 1
+            else:
+                lo = mid
+        return lo
+
+
+class Packed:
+    """History chosen for one prompt, oldest first, with the size accounting."""
+
+    def __init__(self, call_type: str, budget: int, fixed_tokens: int):
+        self.call_type = call_type
+        self.budget = budget
+        self.fixed_tokens = fixed_tokens
+        self.history_tokens = 0
+        self.items: List[Tuple[ChatMessage, str]] = []  # (message, possibly truncated text)
+        self.truncated = 0
+        self.dropped = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.fixed_tokens + self.history_tokens
+
+    @property
+    def text(self) -> str:
+        return "\n".join(text for _, text in self.items)
+
+    def report(self) -> dict:
+        return {
+            "call_type": self.call_type,
+            "budget": self.budget,
+            "tokens": self.tokens,
+            "fixed": self.fixed_tokens,
+            "history": self.history_tokens,
+            "messages": len(self.items),
+            "truncated": self.truncated,
+            "dropped": self.dropped,
+        }
+
+
+def pack(
+    call_type: str,
+    fixed: Sequence[str],
+    history: Sequence[ChatMessage] = (),
+    fmt: Callable[[ChatMessage, str], str] = as_line,
+    overhead: int = LINE_OVERHEAD,
+    budget: Optional[int] = None,
+    floor: int = 0,
+    index: Optional[TokenIndex] = None,
+) -> Packed:
+    """Fit the newest history under the call type's budget, after the fixed parts.
+
+    `fixed` is everything that must be sent (system prompt with memory and summary,
+    instructions, the latest message); it is counted but never cut, so when it alone
+    exceeds the budget the prompt goes out over budget with no history, and that is logged
+    and counted in PROMPT_OVER_BUDGET. History is taken
+    newest first until the budget is spent, each message clipped to
+    PROMPT_MAX_MESSAGE_TOKENS; the newest message is clipped further rather than dropped.
+    Only history[floor:] is considered. Pass the room's whole history with
+    floor=room.summarized_upto and index=room.token_index(): the cut is then found by
+    bisecting the cached costs, and only the messages kept are formatted.
+    """
+    budget = budget_for(call_type) if budget is None else budget
+    packed = Packed(call_type, budget, sum(estimate_tokens(t) for t in fixed))
+    remaining = budget - packed.fixed_tokens
+    index = TokenIndex(history) if index is None else index
+    end = len(history)
+    floor = min(floor, end)
+    start = index.tail_start(end, remaining, overhead, floor)
+    if start == end > floor:
+        # Not even the newest message fits: keep its tail, cut to what's left
+        m = history[-1]
+        room_left = remaining - overhead - estimate_tokens(fmt(m, ""))
+        if room_left > 0:
+            text = fmt(m, clip(index.content(m), room_left))
+            packed.items = [(m, text)]
+            packed.history_tokens = estimate_tokens(text) + overhead
+            packed.truncated = 1
+            start -= 1
+    else:
+        packed.items = [(m, fmt(m, index.content(m))) for m in history[start:end]]
+        packed.history_tokens = index.prefix[end] - index.prefix[start] + overhead * (end - start)
+        packed.truncated = sum(1 for m, _ in packed.items if m.id in index.clipped)
+    packed.dropped = start - floor
+
+    if packed.fixed_tokens > budget:
+        PROMPT_OVER_BUDGET.inc(call_type=call_type)
+        log.warning("%s prompt is over budget before any history: %d fixed tokens, budget %d",
+                    call_type, packed.fixed_tokens, budget)
+    PROMPT_TOKENS.observe(packed.tokens, call_type=call_type)
+    if packed.truncated:
+        PROMPT_TRUNCATED.inc(packed.truncated, call_type=call_type)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Packed %s prompt: %s", call_type, packed.report())
+    return packed
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 from jinja2 import Template
-from typing import Dict
+from typing import Dict, Tuple
 
+from .config import settings
 from .schemas import PersonaConfig, RoomMemory
 
 
@@ -59,9 +61,24 @@ REMEMBER: {% if not emoji_ok %}NO EMOJIS WHATSOEVER.{% endif %} Stay true to you
 """
 
 
+_TEMPLATE = Template(SYSTEM_TMPL)
+
+# (id(persona), memory.version) -> (persona, rendered). The persona is kept alongside so the
+# id cannot be recycled while the entry lives; personas are replaced, never mutated in place.
+_render_cache: "OrderedDict[Tuple[int, int], Tuple[PersonaConfig, str]]" = OrderedDict()
+_render_stats = {"hits": 0, "misses": 0}
+
+
 def render_system(persona: PersonaConfig, memory: RoomMemory) -> str:
-    tmpl = Template(SYSTEM_TMPL)
-    rendered = tmpl.render(
+    key = (id(persona), memory.version)
+    hit = _render_cache.get(key)
+    if hit is not None and hit[0] is persona:
+        _render_cache.move_to_end(key)
+        _render_stats["hits"] += 1
+        return hit[1]
+
+    _render_stats["misses"] += 1
+    rendered = _TEMPLATE.render(
         name=persona.name,
         backstory=persona.backstory,
         tone=persona.tone,
@@ -72,4 +89,11 @@ def render_system(persona: PersonaConfig, memory: RoomMemory) -> str:
         talkativeness=persona.talkativeness,
         structured_output=persona.structured_output,
     )
+    _render_cache[key] = (persona, rendered)
+    if len(_render_cache) > settings.PROMPT_CACHE_SIZE:
+        _render_cache.popitem(last=False)
     return rendered
+
+
+def render_cache_stats() -> Dict[str, int]:
+    return {**_render_stats, "size": len(_render_cache)}
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+from contextvars import ContextVar
+from typing import Awaitable, Dict, Iterable, List, Optional, Set
+
+from .config import settings
+from .log import get_logger
+from .metrics import BOT_PREEMPTED
+
+log = get_logger("preemption")
+
+
+# Upstream calls a bot job would still send from each stage, i.e. what stopping it there saves
+_STAGE_CALLS = {"queued": 1, "gating": 1, "generation": 1, "speculative": 2, "combined": 1, "batched": 0}
+
+PREEMPTION_STATS = {
+    "rounds_preempted": 0,
+    "jobs_cancelled": 0,
+    "mentions_spared": 0,
+    "calls_saved": 0,  # gate/generation calls never sent because their round went stale
+    "by_stage": {stage: 0 for stage in _STAGE_CALLS},
+}
+
+
+class _Job:
+    """One bot's job in a round: the stage it is in and whether that stage's call went out.
+
+    A job that runs two calls at once (a speculative generation beside its gate) gives the
+    second one a child job, so each call's stage and sent state are tracked on their own.
+    """
+
+    __slots__ = ("round", "bot_id", "stage", "sent", "task", "children", "stopped")
+
+    def __init__(self, rnd: "BotRound", bot_id: str, stage: str):
+        self.round = rnd
+        self.bot_id = bot_id
+        self.stage = stage
+        self.sent = False
+        self.task: Optional[asyncio.Task] = None
+        self.children: List[_Job] = []
+        self.stopped = False
+
+
+# The job running in the current task (set by BotRound.track; copied into its subtasks)
+_job: ContextVar[Optional[_Job]] = ContextVar("bot_job", default=None)
+
+
+def enter_stage(stage: str):
+    """Checkpoint before a bot job sends its next upstream call (no-op outside a round).
+
+    Raises CancelledError instead when the job's round has gone stale, so the call is never sent.
+    """
+    job = _job.get()
+    if job is None:
+        return
+    if job.round.stale and job.bot_id not in job.round.spared:
+        job.round.tracker.stop(job, stage)
+        raise asyncio.CancelledError
+    job.stage = stage
+    job.sent = False
+
+
+def spawn(job: Awaitable, stage: str) -> asyncio.Task:
+    """Run `job` as a subtask of the current bot job, with its own stage and sent state.
+
+    Outside a round this is a plain create_task(). Preemption cancels the subtask alone when
+    only its call is still unsent, and with its parent when the parent's is.
+    """
+    parent = _job.get()
+    if parent is None:
+        return asyncio.create_task(job)
+    child = _Job(parent.round, parent.bot_id, stage)
+    parent.children.append(child)
+
+    async def _run():
+        _job.set(child)
+        return await job
+    child.task = asyncio.create_task(_run())
+    return child.task
+
+
+def mark_sent():
+    """Called by the LLM client once a request leaves the scheduler queue for the upstream."""
+    job = _job.get()
+    if job is not None:
+        job.sent = True
+
+
+class BotRound:
+    """One run_bot_round() in flight: its per-bot jobs and the human message count it answers."""
+
+    def __init__(self, tracker: "RoundTracker", seq: int, spared: Set[str]):
+        self.tracker = tracker
+        self.seq = seq
+        self.spared = spared
+        self.jobs: Dict[str, _Job] = {}
+        self._inner: Dict[str, Awaitable] = {}
+        self.preempted: Set[str] = set()
+        self.stale = False
+        self.protected = False
+        self.done = False
+
+    def track(self, bot_id: str, job: Awaitable, stage: str = "queued") -> Awaitable:
+        """Wrap a bot's job so its stage is visible; returns the coroutine to run or schedule."""
+        state = self.jobs[bot_id] = _Job(self, bot_id, stage)
+        self._inner[bot_id] = job
+
+        async def _run():
+            _job.set(state)
+            return await job
+        return _run()
+
+    def started(self, bot_id: str, task: asyncio.Task):
+        self.jobs[bot_id].task = task
+
+    def close_unstarted(self, bot_id: str, wrapper: Awaitable):
+        """Discard a tracked job that never ran (closing the wrapper alone would leak the inner one)."""
+        wrapper.close()
+        self._inner.pop(bot_id).close()
+
+    def is_preempted(self, bot_id: str) -> bool:
+        return bot_id in self.preempted
+
+
+class RoundTracker:
+    """Tracks a room's in-flight bot round and preempts it once newer human messages make it stale.
+
+    Every human message posted to the room's mailbox bumps `human_seq`. A round remembers the
+    count it was started for; once BOT_STALE_AFTER_MESSAGES newer messages have arrived, its
+    bots stop before sending any further upstream call: jobs still waiting in the scheduler
+    queue (or not started) are cancelled at once, the others at their next stage (a gate that
+    said YES skips its generation). Calls already sent are let finish - the upstream does the
+    work either way, and a streamed reply is never cut off halfway. The mailbox then moves on
+    to the newer messages. Bots @mentioned in the round's messages are spared when
+    BOT_STALE_SPARE_MENTIONS is on, and the round after a preempted one always runs to
+    completion, so a room that never stops typing still gets replies.
+    """
+
+    def __init__(self, room_id: str = ""):
+        self.room_id = room_id
+        self.human_seq = 0
+        self.current: Optional[BotRound] = None
+        self._last_preempted = False
+
+    def on_human_message(self, *_):
+        self.human_seq += 1
+        self._check()
+
+    def begin(self, seq: Optional[int], spared: Iterable[str] = ()) -> BotRound:
+        rnd = BotRound(self, self.human_seq if seq is None else seq,
+                       set(spared) if settings.BOT_STALE_SPARE_MENTIONS else set())
+        # Never preempt twice in a row: under a steady stream of messages every round would go stale
+        rnd.protected = self._last_preempted
+        self.current = rnd
+        return rnd
+
+    def end(self, rnd: BotRound):
+        rnd.done = True
+        self._last_preempted = bool(rnd.preempted)
+        if self.current is rnd:
+            self.current = None
+
+    def is_stale(self, rnd: BotRound) -> bool:
+        after = settings.BOT_STALE_AFTER_MESSAGES
+        return after > 0 and not rnd.done and not rnd.protected and self.human_seq - rnd.seq >= after
+
+    def stop(self, job: _Job, stage: str):
+        """Account for a job stopped before sending the call of `stage` (and its unsent subtasks)."""
+        if job.stopped:
+            return
+        job.stopped = True
+        rnd = job.round
+        if not rnd.preempted:
+            PREEMPTION_STATS["rounds_preempted"] += 1
+        if job.bot_id not in rnd.preempted:
+            rnd.preempted.add(job.bot_id)
+            PREEMPTION_STATS["jobs_cancelled"] += 1
+        PREEMPTION_STATS["calls_saved"] += _STAGE_CALLS.get(stage, 1)
+        PREEMPTION_STATS["by_stage"][stage] = PREEMPTION_STATS["by_stage"].get(stage, 0) + 1
+        BOT_PREEMPTED.inc(stage=stage)
+        for child in job.children:
+            if not child.sent and not child.task.done():
+                self.stop(child, child.stage)  # cancelled along with its parent
+
+    def _stop_unsent(self, job: _Job):
+        if job.task.done():
+            return
+        if not job.sent:
+            self.stop(job, job.stage)
+            job.task.cancel()
+        else:
+            for child in job.children:
+                self._stop_unsent(child)
+
+    def _check(self):
+        rnd = self.current
+        if rnd is None or rnd.stale or not self.is_stale(rnd):
+            return
+        rnd.stale = True
+        for bot_id, job in rnd.jobs.items():
+            if bot_id in rnd.spared:
+                if job.task is None or not job.task.done():
+                    PREEMPTION_STATS["mentions_spared"] += 1
+                continue
+            if job.task is None:
+                self.stop(job, job.stage)  # never started: run_bot_round skips it
+            else:
+                self._stop_unsent(job)
+        log.debug("Room %s: bot round went stale (%d newer messages), stopped: %s",
+                  self.room_id, self.human_seq - rnd.seq, sorted(rnd.preempted))
+
+
+def preemption_stats() -> Dict:
+    return {
+        "stale_after_messages": settings.BOT_STALE_AFTER_MESSAGES,
+        **PREEMPTION_STATS,
+        "by_stage": dict(PREEMPTION_STATS["by_stage"]),
+    }
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+
+
+# Priority classes, lower value is served first
+PRIORITY_MENTION = 0  # replies to a direct @mention
+PRIORITY_GENERATION = 1  # regular bot replies, debate arguments, synthesis
+PRIORITY_GATING = 2  # YES/NO gates and dilemma detection
+PRIORITY_FACTS = 3  # background fact extraction
+
+PRIORITY_NAMES = {
+    PRIORITY_MENTION: "mention",
+    PRIORITY_GENERATION: "generation",
+    PRIORITY_GATING: "gating",
+    PRIORITY_FACTS: "facts",
+}
+
+
+class _Ticket:
+    __slots__ = ("priority", "room_id", "future", "enqueued_at", "cancelled")
+
+    def __init__(self, priority: int, room_id: str, future: asyncio.Future):
+        self.priority = priority
+        self.room_id = room_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.cancelled = False
+
+
+class _ClassStats:
+    def __init__(self):
+        self.queued = 0
+        self.dispatched = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent: Deque[float] = deque(maxlen=512)
+
+    def record(self, wait: float):
+        self.dispatched += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.recent.append(wait)
+
+    def as_dict(self) -> Dict:
+        recent = sorted(self.recent)
+
+        def pct(p: float) -> float:
+            return recent[min(len(recent) - 1, int(p * len(recent)))] * 1000 if recent else 0.0
+
+        return {
+            "queued": self.queued,
+            "dispatched": self.dispatched,
+            "wait_avg_ms": (self.wait_total / self.dispatched * 1000) if self.dispatched else 0.0,
+            "wait_p50_ms": pct(0.5),
+            "wait_p95_ms": pct(0.95),
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+
+class LLMScheduler:
+    """Admission control in front of every upstream LLM call.
+
+    At most `max_concurrency` calls are in flight. Waiting calls are served strictly by
+    priority class; within a class, rooms share capacity by weighted fair queuing (start-time
+    fair queuing over per-room virtual finish tags), so one busy room cannot starve the rest.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.in_flight = 0
+        self._heap: List[Tuple[int, float, int, _Ticket]] = []
+        self._seq = itertools.count()
+        self._virtual_time: Dict[int, float] = {}
+        self._room_finish: Dict[Tuple[int, str], float] = {}
+        self._room_queued: Dict[str, int] = {}
+        self._weights: Dict[str, float] = {}
+        self._classes: Dict[int, _ClassStats] = {p: _ClassStats() for p in PRIORITY_NAMES}
+
+    def set_weight(self, room_id: str, weight: float):
+        """Give a room a larger (or smaller) share of capacity within each priority class."""
+        self._weights[room_id] = max(weight, 1e-3)
+
+    def _tag(self, priority: int, room_id: str) -> float:
+        key = (priority, room_id)
+        start = max(self._virtual_time.get(priority, 0.0), self._room_finish.get(key, 0.0))
+        finish = start + 1.0 / self._weights.get(room_id, 1.0)
+        self._room_finish[key] = finish
+        return start
+
+    def _prune(self, priority: int):
+        # Rooms whose last finish tag is behind the class clock no longer affect ordering
+        vt = self._virtual_time[priority]
+        stale = [k for k, f in self._room_finish.items() if k[0] == priority and f <= vt]
+        for k in stale:
+            del self._room_finish[k]
+
+    async def acquire(self, priority: int = PRIORITY_GENERATION, room_id: Optional[str] = None):
+        room_id = room_id or ""
+        stats = self._classes[priority]
+        if self.in_flight < self.max_concurrency and not self.queue_depth:
+            self.in_flight += 1
+            stats.record(0.0)
+            return
+
+        ticket = _Ticket(priority, room_id, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (priority, self._tag(priority, room_id), next(self._seq), ticket))
+        stats.queued += 1
+        self._room_queued[room_id] = self._room_queued.get(room_id, 0) + 1
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Slot was granted just before cancellation: hand it on
+                self.release()
+            else:
+                self._drop(ticket)
+            raise
+
+    def _drop(self, ticket: _Ticket):
+        if not ticket.cancelled:
+            ticket.cancelled = True
+            self._dequeued(ticket)
+
+    def _dequeued(self, ticket: _Ticket):
+        self._classes[ticket.priority].queued -= 1
+        left = self._room_queued.get(ticket.room_id, 1) - 1
+        if left:
+            self._room_queued[ticket.room_id] = left
+        else:
+            self._room_queued.pop(ticket.room_id, None)
+
+    def release(self):
+        self.in_flight -= 1
+        while self._heap and self.in_flight < self.max_concurrency:
+            priority, start, _, ticket = heapq.heappop(self._heap)
+            if ticket.cancelled or ticket.future.done():
+                # Waiter went away (its future is cancelled before its except block runs)
+                self._drop(ticket)
+                continue
+            self._dequeued(ticket)
+            self._virtual_time[priority] = start
+            if len(self._room_finish) > 1024:
+                self._prune(priority)
+            self.in_flight += 1
+            self._classes[priority].record(time.monotonic() - ticket.enqueued_at)
+            ticket.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_GENERATION, room_id: Optional[str] = None):
+        await self.acquire(priority, room_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(c.queued for c in self._classes.values())
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queue_depth,
+            "classes": {PRIORITY_NAMES[p]: c.as_dict() for p, c in self._classes.items()},
+            "rooms_queued": dict(self._room_queued),
+        }
+
+
+scheduler = LLMScheduler()
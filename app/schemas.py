@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+import itertools
+import re
 from typing import List, Dict, Literal, Optional
 from datetime import datetime, timezone
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .config import settings
+
+
+# Process-wide so that a version number identifies one state of one RoomMemory
+_memory_versions = itertools.count(1)
 
 
 class ChatMessage(BaseModel):
@@ -38,9 +46,104 @@ class PersonaConfig(BaseModel):
     structured_output: bool = True
 
 
+# The extractor is asked for comma-separated facts
+_FACT_SPLIT_RE = re.compile(r"[,;\n]+")
+# One repeat of a fact keeps it alive as long as this many newer inserts would
+_FACT_FREQUENCY_WEIGHT = 4
+
+
+def _strip_and(text: str) -> str:
+    # "likes tea, and plays chess" splits into "and plays chess"
+    return text[4:].lstrip() if text[:4].lower() == "and " else text
+
+
+def normalize_fact(text: str) -> str:
+    """Dedup key for a fact: case-, whitespace- and trailing-punctuation-insensitive."""
+    return _strip_and(" ".join(text.lower().split()).strip(" .!*-"))
+
+
+class UserFact(BaseModel):
+    text: str
+    count: int = 1
+    last_seen: int = 0  # insert tick of the room memory, for recency
+
+    def score(self) -> int:
+        return self.last_seen + _FACT_FREQUENCY_WEIGHT * (self.count - 1)
+
+
 class RoomMemory(BaseModel):
     summary: str = ""
+    # Rolling summary hierarchy, level 0 = newest chunk summaries; `summary` is its rendering
+    summary_levels: List[List[str]] = []
+    # user -> normalized fact -> fact; per_user holds the compact rendered view of it
+    facts: Dict[str, Dict[str, UserFact]] = {}
+    _tick: int = PrivateAttr(default=0)
     per_user: Dict[str, str] = {}
+    _version: int = PrivateAttr(default_factory=lambda: next(_memory_versions))
+
+    @property
+    def version(self) -> int:
+        """Changes whenever summary or per_user changes; used to key rendered-prompt caches."""
+        return self._version
+
+    def model_post_init(self, __context):
+        # Rebuilt from a replicated snapshot: continue the insert clock after the newest fact
+        self._tick = max((f.last_seen for facts in self.facts.values() for f in facts.values()), default=0)
+
+    def touch(self):
+        self._version = next(_memory_versions)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in ("summary", "per_user"):
+            self.touch()
+
+    def set_user_note(self, user: str, note: str):
+        """Replace everything known about `user` with the facts in `note`."""
+        self.facts.pop(user, None)
+        self.add_user_facts(user, note)
+
+    def add_user_facts(self, user: str, text: str):
+        """Merge comma-separated facts: repeats refresh the existing entry, caps evict the weakest."""
+        user_facts = self.facts.setdefault(user, {})
+        for raw in _FACT_SPLIT_RE.split(text or ""):
+            fact = raw.strip()[:settings.FACT_MAX_CHARS]
+            key = normalize_fact(fact)
+            if not key:
+                continue
+            self._tick += 1
+            existing = user_facts.get(key)
+            if existing is not None:
+                existing.count += 1
+                existing.last_seen = self._tick
+            else:
+                user_facts[key] = UserFact(text=_strip_and(fact.strip(" .")), last_seen=self._tick)
+            if len(user_facts) > settings.FACTS_PER_USER_MAX:
+                del user_facts[min(user_facts, key=lambda k: user_facts[k].score())]
+        self._evict_room()
+        self._render_facts()
+
+    def _evict_room(self):
+        total = sum(len(f) for f in self.facts.values())
+        while total > settings.FACTS_PER_ROOM_MAX:
+            user, key = min(
+                ((u, k) for u, f in self.facts.items() for k in f),
+                key=lambda uk: self.facts[uk[0]][uk[1]].score(),
+            )
+            del self.facts[user][key]
+            total -= 1
+
+    def _render_facts(self):
+        for user in [u for u, f in self.facts.items() if not f]:
+            del self.facts[user]
+        per_user = {
+            user: "; ".join(f.text for f in sorted(facts.values(), key=UserFact.score, reverse=True))
+            for user, facts in self.facts.items()
+        }
+        # Assigning bumps the version (and invalidates rendered prompts): only when the view changed.
+        # Mutating per_user in place would be invisible to __setattr__, hence a new dict.
+        if per_user != self.per_user:
+            self.per_user = per_user
 
 
 class LLMStructuredResponse(BaseModel):
@@ -53,6 +156,19 @@ class LLMStructuredResponse(BaseModel):
     moderation_flags: List[str] = []
 
 
+class BotReply(BaseModel):
+    bot_id: str
+    speak_now: bool
+    content: str = ""
+
+
+class BatchedBotReplies(BaseModel):
+    """One routing + generation answer for every active bot (BOT_ROUTING_MODE=batched)."""
+    replies: List[BotReply] = []
+    # bot_ids whose entry was present but unusable; only those bots fall back to per-bot calls
+    invalid: List[str] = []
+
+
 class LLMParams(BaseModel):
     temperature: float = 0.7
     top_p: float = 0.9
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict, List
+
+from .config import settings
+from .metrics import BOT_SPECULATION
+
+
+class _BotSpeculation:
+    def __init__(self):
+        self.yes_rate = settings.BOT_YES_RATE_PRIOR
+        self.gates = 0
+        self.speculated = 0
+        self.hits = 0
+        self.wasted = 0
+
+
+class SpeculationPolicy:
+    """Per-bot learned YES-rate deciding when to start generation alongside the gate.
+
+    Every gate answer updates an exponentially weighted YES-rate for that bot. A bot whose
+    rate is at least BOT_SPECULATE_MIN_YES_RATE gets its reply generated concurrently with
+    the gate (when BOT_SPECULATION is on); a NO then cancels or discards the generation.
+    The gate always runs, so the rate keeps learning while speculating.
+    """
+
+    def __init__(self):
+        self.bots: Dict[str, _BotSpeculation] = {}
+
+    def _bot(self, bot: str) -> _BotSpeculation:
+        b = self.bots.get(bot)
+        if b is None:
+            b = self.bots[bot] = _BotSpeculation()
+        return b
+
+    def should_speculate(self, bot: str) -> bool:
+        return settings.BOT_SPECULATION and self._bot(bot).yes_rate >= settings.BOT_SPECULATE_MIN_YES_RATE
+
+    def record_gate(self, bot: str, yes: bool):
+        b = self._bot(bot)
+        b.gates += 1
+        b.yes_rate += settings.BOT_YES_RATE_ALPHA * ((1.0 if yes else 0.0) - b.yes_rate)
+
+    def record_speculation(self, bot: str, hit: bool):
+        b = self._bot(bot)
+        b.speculated += 1
+        if hit:
+            b.hits += 1
+        else:
+            b.wasted += 1
+        BOT_SPECULATION.inc(bot=bot, outcome="hit" if hit else "waste")
+
+    def stats(self) -> Dict:
+        speculated = sum(b.speculated for b in self.bots.values())
+        hits = sum(b.hits for b in self.bots.values())
+        return {
+            "enabled": settings.BOT_SPECULATION,
+            "speculated": speculated,
+            "hit_rate": hits / speculated if speculated else 0.0,
+            "waste_rate": (speculated - hits) / speculated if speculated else 0.0,
+            "bots": {
+                name: {
+                    "yes_rate": round(b.yes_rate, 3),
+                    "gates": b.gates,
+                    "speculated": b.speculated,
+                    "hits": b.hits,
+                    "wasted": b.wasted,
+                }
+                for name, b in self.bots.items()
+            },
+        }
+
+
+speculation = SpeculationPolicy()
+
+
+class HeldDeltas:
+    """on_delta wrapper that holds a speculative stream back until the gate says YES."""
+
+    def __init__(self, on_delta: Callable[[str], Awaitable[Any]]):
+        self.on_delta = on_delta
+        self._held: List[str] = []
+        self._open = False
+
+    async def send(self, delta: str):
+        if self._open and not self._held:
+            await self.on_delta(delta)
+        else:
+            self._held.append(delta)
+
+    async def release(self):
+        # Deltas arriving while we flush queue up behind the held ones, so order is kept
+        while self._held:
+            await self.on_delta(self._held.pop(0))
+        self._open = True
+
@@ -2,9 +2,16 @@ from __future__ import annotations
 
 import time
 import uuid
-from typing import List, Dict, Set, Literal
+from typing import Any, List, Dict, Set, Literal, Optional, TYPE_CHECKING
 
 from .schemas import ChatMessage, RoomMemory, PersonaConfig, LLMParams
+from .packer import TokenIndex
+from .preemption import RoundTracker
+
+if TYPE_CHECKING:
+    from .mailbox import RoomMailbox
+    from .facts import FactJob
+    from .summarizer import Summarizer
 
 
 class RoomState:
@@ -15,33 +22,73 @@ class RoomState:
         self.created_at = created_at if created_at is not None else time.time()
         self.users: Set[str] = set()
         self.history: List[ChatMessage] = []
+        # Packing cost of every message, kept in step with history (see packer.pack)
+        self._tokens = TokenIndex()
         self.memory: RoomMemory = RoomMemory()
         self.persona = persona
         self.params = params
         self.last_ai_ts: float = 0.0
         self.consecutive_ai: int = 0
         self.active_bots: Set[str] = {"gooner"}  # Default active bot
+        self.mailbox: Optional["RoomMailbox"] = None  # attached by the app on first chat
+        self.facts: Optional["FactJob"] = None  # background fact extraction, attached with the mailbox
+        self.summarizer: Optional["Summarizer"] = None  # rolling summary, attached with the mailbox
+        # history[:summarized_upto] is covered by memory.summary and left out of prompts
+        self.summarized_upto: int = 0
+        # Human messages posted to the mailbox, and the bot round they may make stale
+        self.rounds = RoundTracker(id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Room metadata replicated to other workers (history and memory stay local)."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "admin": self.admin,
+            "created_at": self.created_at,
+            "users": sorted(u for u in self.users if u),
+            "active_bots": sorted(self.active_bots),
+            "persona": self.persona.model_dump(),
+            "params": self.params.model_dump(),
+        }
+
+    @classmethod
+    def from_snapshot(cls, snap: Dict[str, Any]) -> "RoomState":
+        room = cls(
+            id=snap["id"],
+            persona=PersonaConfig(**snap["persona"]),
+            params=LLMParams(**snap["params"]),
+            name=snap["name"],
+            admin=snap["admin"],
+            created_at=snap["created_at"],
+        )
+        room.apply_snapshot(snap)
+        return room
+
+    def apply_snapshot(self, snap: Dict[str, Any]):
+        self.name = snap["name"]
+        self.admin = snap["admin"]
+        self.users = set(snap["users"])
+        self.active_bots = set(snap["active_bots"])
+        if snap["persona"] != self.persona.model_dump():
+            self.persona = PersonaConfig(**snap["persona"])
+        if snap["params"] != self.params.model_dump():
+            self.params = LLMParams(**snap["params"])
 
     def append_message(self, user: str, role: Literal["user", "assistant", "system"], content: str) -> ChatMessage:
         msg = ChatMessage(id=str(uuid.uuid4()), room_id=self.id, user=user, role=role, content=content)
         self.history.append(msg)
+        self._tokens.add(msg)
         # Reset consecutive AI counter when a human speaks
         if role == "user":
             self.consecutive_ai = 0
         return msg
 
-    def tail_by_tokens(self, max_tokens: int = 8000) -> List[ChatMessage]:
-        # Naive token approximation: 1 token ~ 4 chars
-        limit_chars = max_tokens * 4
-        out = []
-        total = 0
-        for m in reversed(self.history):
-            l = len(m.content or "")
-            if total + l > limit_chars:
-                break
-            out.insert(0, m)
-            total += l
-        return out
+    def token_index(self) -> TokenIndex:
+        """Cached per-message token costs of the history, for pack(..., index=...)."""
+        # history is a plain list; rebuild the index if someone edited it behind our back
+        if len(self._tokens) != len(self.history):
+            self._tokens = TokenIndex(self.history)
+        return self._tokens
 
     def since_last_human_secs(self) -> float:
         now = time.time()
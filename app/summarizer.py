@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
+
+import httpx
+
+from .config import settings
+from .llm_client import chat
+from .log import get_logger
+from .packer import LINE_OVERHEAD, budget_for, pack
+from .schemas import ChatMessage
+from .scheduler import PRIORITY_FACTS
+from .tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from .state import RoomState
+
+log = get_logger("summarizer")
+
+
+CHUNK_PROMPT = """Summarize this stretch of a group chat in at most {sentences} sentences.
+Keep who said or decided what, names, open questions and anything people will refer back to.
+Plain text only.
+
+{text}"""
+
+MERGE_PROMPT = """These are summaries of consecutive stretches of one group chat, oldest first.
+Merge them into one summary of at most {sentences} sentences, keeping names, decisions and
+open threads. Plain text only.
+
+{text}"""
+
+
+def render_summary(levels: List[List[str]]) -> str:
+    """Oldest (highest level) first, so the summary reads in conversation order."""
+    return "\n".join(s for level in reversed(levels) for s in level)
+
+
+class Summarizer:
+    """Rolling hierarchical summary of one room, kept in `room.memory.summary`.
+
+    The newest SUMMARY_LIVE_MESSAGES messages stay raw (the live window). Older messages are
+    folded in chunks of SUMMARY_CHUNK_MESSAGES into level-0 summaries; once a level holds more
+    than SUMMARY_FANOUT summaries, its oldest SUMMARY_FANOUT are merged into one summary a
+    level up. The rendered summary therefore grows only logarithmically with room length, and
+    prompts carry at most live window + one chunk of raw messages.
+
+    Runs in the background after orchestrations and is deferred while `is_busy()` says so.
+    """
+
+    def __init__(
+        self,
+        room: "RoomState",
+        client: httpx.AsyncClient,
+        is_busy: Optional[Callable[[], bool]] = None,
+        live_messages: Optional[int] = None,
+        chunk_messages: Optional[int] = None,
+        fanout: Optional[int] = None,
+        on_update: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.room = room
+        self.client = client
+        self.is_busy = is_busy or (lambda: False)
+        self.on_update = on_update  # awaited after each published summary (e.g. to replicate it)
+        self.live_messages = settings.SUMMARY_LIVE_MESSAGES if live_messages is None else live_messages
+        self.chunk_messages = chunk_messages or settings.SUMMARY_CHUNK_MESSAGES
+        self.fanout = max(2, fanout or settings.SUMMARY_FANOUT)
+        self._task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.chunks = 0
+        self.merges = 0
+        self.deferred = 0
+        self.failures = 0
+
+    def _next_chunk(self) -> List[ChatMessage]:
+        start = self.room.summarized_upto
+        end = len(self.room.history) - self.live_messages
+        if end - start < self.chunk_messages:
+            return []
+        return self.room.history[start:start + self.chunk_messages]
+
+    def _fit(self, chunk: List[ChatMessage]) -> List[ChatMessage]:
+        """The oldest messages of chunk that fit the summary budget (at least one, clipped if need be)."""
+        start = self.room.summarized_upto
+        room_left = budget_for("summary") - estimate_tokens(CHUNK_PROMPT.format(sentences=3, text=""))
+        stop = self.room.token_index().head_end(start, start + len(chunk), room_left, LINE_OVERHEAD)
+        return chunk[:max(1, stop - start)]
+
+    def notify(self):
+        """Call after new messages land in the room; folds a chunk once one has aged out."""
+        if self._task is not None and not self._task.done():
+            return
+        if not self._next_chunk():
+            return
+        if self.is_busy():
+            self.deferred += 1
+            if self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(settings.SUMMARY_DEFER_SEC, self._retry)
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def _retry(self):
+        self._timer = None
+        self.notify()
+
+    async def _complete(self, prompt: str) -> str:
+        resp = await chat(
+            client=self.client,
+            messages=[{"role": "user", "content": prompt}],
+            params={"temperature": 0.2, "max_tokens": settings.SUMMARY_MAX_TOKENS},
+            stream=False,
+            priority=PRIORITY_FACTS,
+            room_id=self.room.id,
+        )
+        if isinstance(resp, dict):
+            return (resp.get("choices") or [{}])[0].get("message", {}).get("content", "").strip()
+        return str(resp).strip()
+
+    async def _run(self):
+        try:
+            while chunk := self._next_chunk():
+                # Large pastes make a chunk shorter rather than the prompt longer
+                chunk = self._fit(chunk)
+                text = pack("summary", [CHUNK_PROMPT.format(sentences=3, text="")], chunk).text
+                summary = await self._complete(CHUNK_PROMPT.format(sentences=3, text=text))
+                if not summary:
+                    raise ValueError("empty summary")
+                levels = [list(level) for level in self.room.memory.summary_levels] or [[]]
+                levels[0].append(summary)
+                self.chunks += 1
+                await self._cascade(levels)
+                # Publish summary and watermark together: a message is always either raw or summarized
+                self.room.memory.summary_levels = levels
+                self.room.memory.summary = render_summary(levels)
+                self.room.summarized_upto += len(chunk)
+                if self.on_update is not None:
+                    await self.on_update()
+        except Exception as e:
+            self.failures += 1
+            log.error("Summarizing room %s failed: %s", self.room.id, e)
+        finally:
+            self._task = None
+
+    async def _cascade(self, levels: List[List[str]]):
+        level = 0
+        while level < len(levels):
+            if len(levels[level]) > self.fanout:
+                merged_from = levels[level][:self.fanout]
+                text = "\n\n".join(merged_from)
+                merged = await self._complete(MERGE_PROMPT.format(sentences=4, text=text))
+                if not merged:
+                    raise ValueError("empty merged summary")
+                levels[level] = levels[level][self.fanout:]
+                if level + 1 == len(levels):
+                    levels.append([])
+                levels[level + 1].append(merged)
+                self.merges += 1
+            level += 1
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "summarized_upto": self.room.summarized_upto,
+            "levels": [len(level) for level in self.room.memory.summary_levels],
+            "chunks": self.chunks,
+            "merges": self.merges,
+            "deferred": self.deferred,
+            "failures": self.failures,
+        }
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import re
+
+
+# Roughly how BPE tokenizers split text: runs of letters, short digit groups, and every
+# other non-space character (punctuation, emoji, CJK) on its own
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|\S")
+# Long words split into several tokens; ~6 letters per piece is close for English
+_WORD_PIECE = 6
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate: one per word piece, digit group or symbol."""
+    if not text:
+        return 0
+    pieces = _TOKEN_RE.findall(text)
+    return len(pieces) + sum((len(p) - 1) // _WORD_PIECE for p in pieces if len(p) > _WORD_PIECE)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " …") -> str:
+    """Cut text so that estimate_tokens(result) <= max_tokens (marker included)."""
+    if max_tokens <= 0 or not text:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(marker)
+    used = 0
+    for m in _TOKEN_RE.finditer(text):
+        n = m.end() - m.start()
+        cost = 1 + ((n - 1) // _WORD_PIECE if n > _WORD_PIECE else 0)
+        if used + cost > budget:
+            return text[:m.start()].rstrip() + marker
+        used += cost
+    return text
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import time
+from collections import deque
+from typing import Deque, Dict
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import settings
+from .log import get_logger
+from .scheduler import PRIORITY_MENTION, PRIORITY_GENERATION, PRIORITY_GATING, PRIORITY_FACTS
+
+log = get_logger("transport")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for the upstream LLM.
+
+    closed -> open after `failure_threshold` consecutive failures; while open every call
+    fails fast with CircuitOpenError. After `reset_sec` one trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int | None = None, reset_sec: float | None = None):
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURES
+        self.reset_sec = settings.LLM_BREAKER_RESET_SEC if reset_sec is None else reset_sec
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_started = 0.0
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_sec:
+                self.rejected += 1
+                raise CircuitOpenError("LLM upstream circuit is open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            # One trial at a time; a trial that never reported back (cancelled) expires
+            now = time.monotonic()
+            if now - self._trial_started < self.reset_sec:
+                self.rejected += 1
+                raise CircuitOpenError("LLM upstream circuit is half-open, trial call in flight")
+            self._trial_started = now
+
+    def record_success(self):
+        self._trial_started = 0.0
+        self.failures = 0
+        self.state = "closed"
+
+    def abandon(self):
+        """Forget a call that ended without a verdict (cancelled), freeing the half-open trial."""
+        self._trial_started = 0.0
+
+    def record_failure(self):
+        self._trial_started = 0.0
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+breaker = CircuitBreaker()
+
+
+class HedgePolicy:
+    """When to fire a duplicate request, and how many we can afford.
+
+    The deadline adapts to recent latencies of hedged call sites (the configured percentile
+    of the last few hundred calls). The budget is a token bucket: every primary request earns
+    LLM_HEDGE_MAX_FRACTION tokens (capped at LLM_HEDGE_BURST) and each hedge spends one, so
+    hedging never adds more than that fraction of extra load.
+    """
+
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=256)
+        self.tokens = settings.LLM_HEDGE_BURST
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped_budget = 0
+
+    def deadline(self) -> float:
+        if len(self.latencies) < 20:
+            return settings.LLM_HEDGE_DEFAULT_SEC
+        recent = sorted(self.latencies)
+        return recent[min(len(recent) - 1, int(settings.LLM_HEDGE_PERCENTILE * len(recent)))]
+
+    def on_primary(self):
+        self.primaries += 1
+        self.tokens = min(settings.LLM_HEDGE_BURST, self.tokens + settings.LLM_HEDGE_MAX_FRACTION)
+
+    def try_hedge(self) -> bool:
+        if self.tokens < 1.0:
+            self.skipped_budget += 1
+            return False
+        self.tokens -= 1.0
+        self.hedges += 1
+        return True
+
+    def record(self, latency: float, hedge_won: bool = False):
+        self.latencies.append(latency)
+        if hedge_won:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": settings.LLM_HEDGE_ENABLED,
+            "deadline_ms": self.deadline() * 1000,
+            "primaries": self.primaries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "skipped_budget": self.skipped_budget,
+            "extra_load": (self.hedges / self.primaries) if self.primaries else 0.0,
+        }
+
+
+hedging = HedgePolicy()
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """Errors that say the upstream is unhealthy (and are worth retrying)."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500 or exc.response.status_code == 429
+    return isinstance(exc, httpx.TransportError)
+
+
+def error_kind(exc: BaseException) -> str:
+    """Short label for an upstream failure, used by the error counters."""
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return "http_429" if code == 429 else f"http_{code // 100}xx"
+    if isinstance(exc, (httpx.TimeoutException, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, httpx.TransportError):
+        return "transport"
+    return "other"
+
+
+def deadline_for(priority: int) -> float:
+    """Per-call-class deadline for a whole call, retries included (a stream: until its last delta).
+
+    YES/NO gates must answer fast, generation may take longer.
+    """
+    return {
+        PRIORITY_MENTION: settings.LLM_TIMEOUT_GENERATION_SEC,
+        PRIORITY_GENERATION: settings.LLM_TIMEOUT_GENERATION_SEC,
+        PRIORITY_GATING: settings.LLM_TIMEOUT_GATING_SEC,
+        PRIORITY_FACTS: settings.LLM_TIMEOUT_FACTS_SEC,
+    }.get(priority, settings.LLM_TIMEOUT_GENERATION_SEC)
+
+
+def timeout_for(priority: int) -> httpx.Timeout:
+    """httpx timeouts for one attempt: connect, and each single read or write (not the whole call).
+
+    No one read may take longer than the call's deadline_for(); the deadline itself is enforced
+    around the call by the client.
+    """
+    per_op = deadline_for(priority)
+    return httpx.Timeout(per_op, connect=min(per_op, settings.LLM_CONNECT_TIMEOUT_SEC))
+
+
+def create_client() -> httpx.AsyncClient:
+    """Shared upstream client with explicit pool sizing, keep-alive and optional HTTP/2."""
+    http2 = settings.LLM_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        log.error("LLM_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.LLM_POOL_MAX,
+        max_keepalive_connections=settings.LLM_POOL_KEEPALIVE,
+        keepalive_expiry=settings.LLM_KEEPALIVE_SEC,
+    )
+    return httpx.AsyncClient(limits=limits, http2=http2, timeout=timeout_for(PRIORITY_GENERATION))
+
+
+async def prewarm(client: httpx.AsyncClient, url: str, connections: int | None = None):
+    """Open keep-alive connections (DNS, TCP, TLS) before the first real request needs them."""
+    connections = settings.LLM_PREWARM_CONNECTIONS if connections is None else connections
+    if connections <= 0:
+        return
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}/"
+
+    async def _one():
+        try:
+            await client.head(origin, timeout=timeout_for(PRIORITY_GATING))
+        except httpx.HTTPError:
+            pass
+
+    await asyncio.gather(*(_one() for _ in range(connections)))
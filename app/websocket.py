@@ -2,34 +2,208 @@ from __future__ import annotations
 
 import asyncio
 import json
-from typing import Dict, Set, Callable
+import time
+from collections import deque
+from typing import Awaitable, Deque, Dict, Set, Callable, Tuple
 
 from fastapi import WebSocket
 
+from .config import settings
+from .broker import Broker, Envelope, create_broker
+from .metrics import STAGE_SECONDS
+
+
+# Frames that may be dropped for a slow consumer before it gets disconnected
+DROPPABLE_TYPES = {"typing"}
+
+
+class _Connection:
+    """One socket with its own bounded outbound queue, drained by a dedicated writer task."""
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.queue: Deque[Tuple[str, bool]] = deque()  # (payload, droppable)
+        self.ready = asyncio.Event()
+        self.writer: asyncio.Task | None = None
+        self.dropped = 0
+        self.closing = False
+        self.last_seen = time.monotonic()
+
+    def push(self, data: str, droppable: bool):
+        self.queue.append((data, droppable))
+        self.ready.set()
+
+    def evict_droppable(self) -> bool:
+        for i, (_, droppable) in enumerate(self.queue):
+            if droppable:
+                del self.queue[i]
+                self.dropped += 1
+                return True
+        return False
+
 
 class ConnectionManager:
-    def __init__(self):
-        # rooms -> set of websockets
-        self.rooms: Dict[str, Set[WebSocket]] = {}
-        self.lock = asyncio.Lock()
+    """Room-scoped registry of sockets.
+
+    Membership is copy-on-write and lock-free: each room maps to a dict that is never
+    mutated once published, and joins/leaves swap in a new dict without awaiting in between
+    (atomic on the event loop). A broadcast just grabs the current snapshot, so it never
+    waits on membership changes, in its own room or any other.
+    """
+
+    def __init__(self, queue_size: int | None = None, overflow_policy: str | None = None, broker: Broker | None = None):
+        # rooms -> websocket -> connection (immutable snapshot per room)
+        self.rooms: Dict[str, Dict[WebSocket, _Connection]] = {}
+        # Broadcasts go through the broker so sockets held by other workers receive them too
+        self.broker = broker or create_broker()
+        self.broker.subscribe(self._on_envelope)
+        # Called with every envelope published by another worker (room replication etc.)
+        self.on_remote: Callable[[Envelope], Awaitable[None]] | None = None
+        self.queue_size = queue_size or settings.WS_SEND_QUEUE_MAX
+        # "drop_typing": drop typing frames first, then disconnect; "disconnect": disconnect right away
+        self.overflow_policy = overflow_policy or settings.WS_OVERFLOW_POLICY
+        self.reaped: Dict[str, int] = {"send_error": 0, "idle": 0, "overflow": 0}
+        self._heartbeat: asyncio.Task | None = None
+        # Fire-and-forget reaps started from sync code; held here so they can't be collected mid-run
+        self._reaps: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Connect the broker and start the heartbeat loop (pings every WS_PING_INTERVAL_SEC, evicts idle sockets)."""
+        await self.broker.start()
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        for task in list(self._reaps):
+            task.cancel()
+        await self.broker.stop()
+        for room_id, conns in list(self.rooms.items()):
+            for ws in list(conns):
+                await self.disconnect(room_id, ws)
 
     async def connect(self, room_id: str, ws: WebSocket):
         await ws.accept()
-        async with self.lock:
-            self.rooms.setdefault(room_id, set()).add(ws)
+        conn = _Connection(ws)
+        conn.writer = asyncio.create_task(self._writer(room_id, conn))
+        conns = dict(self.rooms.get(room_id, {}))
+        conns[ws] = conn
+        self.rooms[room_id] = conns
 
     async def disconnect(self, room_id: str, ws: WebSocket):
-        async with self.lock:
-            if room_id in self.rooms and ws in self.rooms[room_id]:
-                self.rooms[room_id].remove(ws)
+        conns = self.rooms.get(room_id)
+        if conns is None or ws not in conns:
+            return
+        conn = conns[ws]
+        remaining = {w: c for w, c in conns.items() if w is not ws}
+        if remaining:
+            self.rooms[room_id] = remaining
+        else:
+            # last socket left: drop the room entry
+            del self.rooms[room_id]
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    def touch(self, room_id: str, ws: WebSocket):
+        """Record that the client is alive (any received frame, including pong)."""
+        conn = self.rooms.get(room_id, {}).get(ws)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
+
+    async def _reap(self, room_id: str, conn: _Connection, reason: str):
+        """Evict a dead or misbehaving socket and close it."""
+        if conn.closing:
+            return
+        conn.closing = True
+        self.reaped[reason] += 1
+        await self.disconnect(room_id, conn.ws)
+        try:
+            await conn.ws.close(code=1013 if reason == "overflow" else 1001)
+        except Exception:
+            pass
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.WS_PING_INTERVAL_SEC)
+            now = time.monotonic()
+            ping = json.dumps({"type": "ping", "ts": time.time()})
+            for room_id, conns in list(self.rooms.items()):
+                for conn in list(conns.values()):
+                    if now - conn.last_seen > settings.WS_IDLE_TIMEOUT_SEC:
+                        await self._reap(room_id, conn, "idle")
+                    else:
+                        self._offer(room_id, conn, ping, False)
+
+    async def _writer(self, room_id: str, conn: _Connection):
+        try:
+            while True:
+                while not conn.queue:
+                    conn.ready.clear()
+                    await conn.ready.wait()
+                data, _ = conn.queue.popleft()
+                await conn.ws.send_text(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the socket is gone: stop paying for sends to it
+            await self._reap(room_id, conn, "send_error")
+
+    def _offer(self, room_id: str, conn: _Connection, data: str, droppable: bool):
+        """Enqueue without blocking; apply the overflow policy if the consumer is too slow."""
+        if conn.closing:
+            return
+        if len(conn.queue) < self.queue_size:
+            conn.push(data, droppable)
+            return
+        if self.overflow_policy == "drop_typing":
+            if droppable:
+                conn.dropped += 1
+                return
+            if conn.evict_droppable():
+                conn.push(data, droppable)
+                return
+        # Slow consumer: cut it loose rather than buffer without bound
+        task = asyncio.create_task(self._reap(room_id, conn, "overflow"))
+        self._reaps.add(task)
+        task.add_done_callback(self._reaps.discard)
+
+    async def send(self, room_id: str, ws: WebSocket, message: Dict):
+        """Send to a single socket through its queue, so it never races the writer task."""
+        conn = self.rooms.get(room_id, {}).get(ws)
+        if conn is None:
+            await ws.send_text(json.dumps(message))
+            return
+        self._offer(room_id, conn, json.dumps(message), message.get("type") in DROPPABLE_TYPES)
+
+    async def publish(self, kind: str, room_id: str | None, data: Dict):
+        """Publish a non-frame event (e.g. room metadata) to every worker."""
+        await self.broker.publish({"kind": kind, "room_id": room_id, "data": data})
 
     async def broadcast(self, room_id: str, message: Dict):
-        async with self.lock:
-            sockets = list(self.rooms.get(room_id, []))
+        with STAGE_SECONDS.time(stage="broadcast"):
+            await self.publish("frame", room_id, message)
+
+    async def _on_envelope(self, envelope: Envelope):
+        if envelope.get("kind") == "frame":
+            self.deliver(envelope["room_id"], envelope["data"])
+        if envelope.get("origin") != self.broker.worker_id and self.on_remote is not None:
+            await self.on_remote(envelope)
+
+    def deliver(self, room_id: str, message: Dict):
+        """Fan a frame out to the sockets this worker holds for the room."""
+        conns = self.rooms.get(room_id)
+        if not conns:
+            return
+        # Serialize once, then fan out by enqueueing: a slow client never delays the others
         data = json.dumps(message)
-        for s in sockets:
-            try:
-                await s.send_text(data)
-            except Exception:
-                # ignore send errors
-                pass
+        droppable = message.get("type") in DROPPABLE_TYPES
+        for conn in conns.values():
+            self._offer(room_id, conn, data, droppable)
+
+    def stats(self) -> Dict:
+        return {
+            "rooms": len(self.rooms),
+            "live": sum(len(conns) for conns in self.rooms.values()),
+            "reaped": dict(self.reaped),
+        }
@@ -0,0 +1,108 @@
+"""Contention benchmark for ConnectionManager across many concurrent rooms.
+
+Run from the repo root:
+
+    python -m bench.bench_connection_registry [rooms] [sockets_per_room]
+
+Every room runs its own task that broadcasts while a churn task keeps joining and
+leaving sockets in random rooms. Reports broadcast latency for the copy-on-write
+registry and for a variant using the old single global lock around membership
+changes and snapshots.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from app.websocket import ConnectionManager
+
+BROADCASTS_PER_ROOM = 50
+
+
+class _FakeSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(0)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class GlobalLockManager(ConnectionManager):
+    """The previous locking scheme: one asyncio.Lock across every room."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = asyncio.Lock()
+
+    async def connect(self, room_id, ws):
+        async with self.lock:
+            await super().connect(room_id, ws)
+
+    async def disconnect(self, room_id, ws):
+        async with self.lock:
+            await super().disconnect(room_id, ws)
+
+    async def broadcast(self, room_id, message):
+        async with self.lock:
+            conns = self.rooms.get(room_id)
+        if conns:
+            await super().broadcast(room_id, message)
+
+
+async def _run(manager: ConnectionManager, rooms: int, per_room: int) -> list[float]:
+    for r in range(rooms):
+        for _ in range(per_room):
+            await manager.connect(f"room-{r}", _FakeSocket())
+
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def room_loop(r: int):
+        for i in range(BROADCASTS_PER_ROOM):
+            t = time.perf_counter()
+            await manager.broadcast(f"room-{r}", {"type": "chat", "i": i})
+            latencies.append(time.perf_counter() - t)
+            await asyncio.sleep(0)
+
+    async def churn():
+        rnd = random.Random(0)
+        while not done.is_set():
+            room_id = f"room-{rnd.randrange(rooms)}"
+            ws = _FakeSocket()
+            await manager.connect(room_id, ws)
+            await asyncio.sleep(0)
+            await manager.disconnect(room_id, ws)
+
+    churners = [asyncio.create_task(churn()) for _ in range(32)]
+    await asyncio.gather(*(room_loop(r) for r in range(rooms)))
+    done.set()
+    await asyncio.gather(*churners)
+    await manager.stop()
+    return latencies
+
+
+def _report(name: str, lat: list[float], wall: float):
+    lat = sorted(lat)
+    p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1e6
+    print(f"{name:<12} broadcasts={len(lat):>7} wall={wall:6.2f}s "
+          f"p50={p(0.5):8.1f}us p99={p(0.99):8.1f}us mean={statistics.fmean(lat) * 1e6:8.1f}us")
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    per_room = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{rooms} rooms x {per_room} sockets, {BROADCASTS_PER_ROOM} broadcasts per room, 32 churn tasks")
+    for name, cls in (("cow", ConnectionManager), ("global-lock", GlobalLockManager)):
+        t = time.perf_counter()
+        lat = asyncio.run(_run(cls(), rooms, per_room))
+        _report(name, lat, time.perf_counter() - t)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Micro-benchmark for packing a prompt's history as the room history grows.
+
+Run from the repo root:
+
+    python -m bench.bench_pack
+
+Compares pack() bisecting the room's cached token index against a newest-first walk that
+clips and estimates every message it visits, for the prompt budgets of the call types.
+"""
+from __future__ import annotations
+
+import random
+import string
+import timeit
+
+from app.config import load_default_persona
+from app.packer import LINE_OVERHEAD, as_line, clip, pack
+from app.schemas import LLMParams, PersonaConfig
+from app.state import RoomState
+from app.tokens import estimate_tokens
+
+SIZES = [100, 1_000, 10_000, 100_000]
+BUDGETS = [8000, 4000, 2000]
+
+
+def _walk(history, budget):
+    out = []
+    for m in reversed(history):
+        cost = estimate_tokens(as_line(m, clip(m.content))) + LINE_OVERHEAD
+        if cost > budget:
+            break
+        out.append(m)
+        budget -= cost
+    out.reverse()
+    return out
+
+
+def _room(n: int) -> RoomState:
+    rnd = random.Random(n)
+    room = RoomState("bench", PersonaConfig(**load_default_persona()), LLMParams())
+    for i in range(n):
+        text = "".join(rnd.choices(string.ascii_letters + " ", k=rnd.randint(10, 400)))
+        room.append_message(f"user{i % 7}", "user", text)
+    return room
+
+
+def main():
+    print(f"{'history':>8} {'budget':>7} {'bisect us':>10} {'walk us':>10} {'kept':>6}")
+    for n in SIZES:
+        room = _room(n)
+        for budget in BUDGETS:
+            reps = 500
+            new = timeit.timeit(
+                lambda: pack("generation", [], room.history, budget=budget, index=room.token_index()), number=reps
+            ) / reps * 1e6
+            old = timeit.timeit(lambda: _walk(room.history, budget), number=reps // 10) / (reps // 10) * 1e6
+            kept = len(pack("generation", [], room.history, budget=budget, index=room.token_index()).items)
+            print(f"{n:>8} {budget:>7} {new:>10.2f} {old:>10.2f} {kept:>6}")
+
+
+if __name__ == "__main__":
+    main()
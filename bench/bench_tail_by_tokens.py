@@ -0,0 +1,67 @@
+"""Micro-benchmark for finding the history tail that fits a token budget as the room grows.
+
+Run from the repo root:
+
+    python -m bench.bench_tail_by_tokens
+
+Compares bisecting the room's cached per-message token costs (RoomState.token_index(), the
+index pack() uses) against the old reverse walk with list.insert(0, ...), for the three
+budgets used per incoming message. Appending a message costs one estimate; finding the
+tail is O(log n) plus the slice.
+"""
+from __future__ import annotations
+
+import random
+import string
+import timeit
+
+from app.config import load_default_persona
+from app.packer import LINE_OVERHEAD
+from app.schemas import LLMParams, PersonaConfig
+from app.state import RoomState
+
+SIZES = [100, 1_000, 10_000, 100_000]
+BUDGETS = [8000, 4000, 2000]
+
+
+def _legacy_tail(history, max_tokens):
+    limit_chars = max_tokens * 4
+    out = []
+    total = 0
+    for m in reversed(history):
+        l = len(m.content or "")
+        if total + l > limit_chars:
+            break
+        out.insert(0, m)
+        total += l
+    return out
+
+
+def _tail(room: RoomState, max_tokens: int):
+    index = room.token_index()
+    return room.history[index.tail_start(len(index), max_tokens, LINE_OVERHEAD):]
+
+
+def _room(n: int) -> RoomState:
+    rnd = random.Random(n)
+    room = RoomState("bench", PersonaConfig(**load_default_persona()), LLMParams())
+    for i in range(n):
+        text = "".join(rnd.choices(string.ascii_letters + " ", k=rnd.randint(10, 400)))
+        room.append_message(f"user{i % 7}", "user", text)
+    return room
+
+
+def main():
+    print(f"{'history':>8} {'budget':>7} {'bisect us':>10} {'legacy us':>10} {'kept':>6}")
+    for n in SIZES:
+        room = _room(n)
+        for budget in BUDGETS:
+            reps = 2000
+            new = timeit.timeit(lambda: _tail(room, budget), number=reps) / reps * 1e6
+            old = timeit.timeit(lambda: _legacy_tail(room.history, budget), number=reps // 10) / (reps // 10) * 1e6
+            kept = len(_tail(room, budget))
+            print(f"{n:>8} {budget:>7} {new:>10.2f} {old:>10.2f} {kept:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""End-to-end load driver: N rooms x M WebSocket users against a running app.
+
+Start the mock upstream and the app first (see bench/mock_jllm.py), then:
+
+    python -m bench.loadtest --rooms 20 --users 3 --messages 10 --interval 2.0 --bots gooner,zen,goblin
+
+Every user sends --messages chat lines, one every --interval seconds (jittered). For each
+human message the driver measures time until the next bot reply lands in that room, and
+reads the mock's /stats to report upstream LLM calls per human message.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+import websockets
+
+BOT_FRAMES = {"chat", "chat.done"}
+
+
+class RoomProbe:
+    """Pending human messages of one room, resolved by the next bot reply."""
+
+    def __init__(self):
+        self.pending: List[float] = []
+        self.latencies: List[float] = []
+        self.bot_replies = 0
+
+    def sent(self):
+        self.pending.append(time.perf_counter())
+
+    def bot_reply(self):
+        now = time.perf_counter()
+        self.bot_replies += 1
+        self.latencies.extend(now - t for t in self.pending)
+        self.pending.clear()
+
+
+async def _user(base_ws: str, room_id: str, name: str, probe: RoomProbe, observer: bool, args, stop: asyncio.Event):
+    async with websockets.connect(f"{base_ws}/ws/{room_id}", max_size=None) as ws:
+        await ws.send(json.dumps({"type": "join", "user": name}))
+
+        async def reader():
+            async for raw in ws:
+                frame = json.loads(raw)
+                if frame.get("type") == "ping":
+                    await ws.send(json.dumps({"type": "pong"}))
+                elif observer and frame.get("type") in BOT_FRAMES and not frame.get("aborted") and frame.get("user") != name and (
+                    frame.get("is_bot") or frame.get("user") not in args.humans
+                ):
+                    probe.bot_reply()
+
+        read_task = asyncio.create_task(reader())
+        try:
+            for i in range(args.messages):
+                await asyncio.sleep(args.interval * random.uniform(0.5, 1.5))
+                probe.sent()
+                await ws.send(json.dumps({"type": "chat", "user": name, "content": f"{name} message {i}: what do you all think?"}))
+            await stop.wait()
+        finally:
+            read_task.cancel()
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(args):
+    base_ws = args.base.replace("http://", "ws://").replace("https://", "wss://")
+    bots = [b for b in args.bots.split(",") if b]
+    async with httpx.AsyncClient(timeout=30.0) as http:
+        await http.post(f"{args.mock}/stats/reset")
+        room_ids = []
+        for r in range(args.rooms):
+            resp = await http.post(f"{args.base}/api/rooms/create", json={"name": f"load-{r}", "admin": f"r{r}u0", "initial_bot": bots[0]})
+            room_ids.append(resp.json()["room_id"])
+
+        # Admins add the remaining bots
+        for r, room_id in enumerate(room_ids):
+            async with websockets.connect(f"{base_ws}/ws/{room_id}") as ws:
+                for bot in bots[1:]:
+                    await ws.send(json.dumps({"type": "bot.add", "user": f"r{r}u0", "bot_id": bot}))
+
+        probes: Dict[str, RoomProbe] = {room_id: RoomProbe() for room_id in room_ids}
+        args.humans = {f"r{r}u{u}" for r in range(args.rooms) for u in range(args.users)}
+        stop = asyncio.Event()
+        started = time.perf_counter()
+        users = [
+            asyncio.create_task(_user(base_ws, room_id, f"r{r}u{u}", probes[room_id], u == 0, args, stop))
+            for r, room_id in enumerate(room_ids)
+            for u in range(args.users)
+        ]
+        # Let the senders finish, then give in-flight replies time to land
+        await asyncio.sleep(args.messages * args.interval * 1.5 + args.drain)
+        stop.set()
+        await asyncio.gather(*users, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        upstream = (await http.get(f"{args.mock}/stats")).json()
+
+    latencies = [l for p in probes.values() for l in p.latencies]
+    human = args.rooms * args.users * args.messages
+    unanswered = sum(len(p.pending) for p in probes.values())
+    replies = sum(p.bot_replies for p in probes.values())
+    print(f"rooms={args.rooms} users/room={args.users} bots={bots} human messages={human} elapsed={elapsed:.1f}s")
+    print(f"time-to-bot-reply  p50={_pct(latencies, 0.5):.3f}s p95={_pct(latencies, 0.95):.3f}s "
+          f"p99={_pct(latencies, 0.99):.3f}s  (unanswered={unanswered})")
+    print(f"LLM calls per human message: {upstream.get('total', 0) / human:.2f}  {upstream}")
+    print(f"throughput: {human / elapsed:.1f} human msg/s, {replies / elapsed:.1f} bot replies/s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base", default="http://127.0.0.1:8000", help="app base URL")
+    ap.add_argument("--mock", default="http://127.0.0.1:9000", help="mock JLLM base URL")
+    ap.add_argument("--rooms", type=int, default=10)
+    ap.add_argument("--users", type=int, default=3)
+    ap.add_argument("--messages", type=int, default=5, help="chat messages per user")
+    ap.add_argument("--interval", type=float, default=2.0, help="mean seconds between a user's messages")
+    ap.add_argument("--bots", default="gooner,zen", help="comma-separated bot ids per room")
+    ap.add_argument("--drain", type=float, default=10.0, help="seconds to wait for late replies")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Local stand-in for the JLLM completions endpoint.
+
+Run from the repo root, then point the app at it with JLLM_URL:
+
+    python -m bench.mock_jllm --port 9000 --latency lognormal:0.8,0.4 --gate-latency fixed:0.15 --yes-rate 0.6
+    JLLM_URL=http://127.0.0.1:9000/completions uvicorn app.main:app
+
+Latency specs: fixed:S | uniform:A,B | exp:MEAN | lognormal:MEDIAN,SIGMA (seconds).
+YES/NO prompts are answered from --script (cycled, e.g. YES,NO,NO) or at --yes-rate; so is
+each bot's speak_now in a batched routing prompt (mentioned bots always speak) and the
+speak_now of a combined gate-and-reply prompt (answered in a ```json fence, as models do).
+Responses are SSE when the request asks for stream=true (--sse auto), or always/never.
+GET /stats returns call counts by kind; POST /stats/reset clears them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+from collections import Counter
+from typing import Callable, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    kind, _, args = spec.partition(":")
+    vals = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: vals[0]
+    if kind == "uniform":
+        return lambda: random.uniform(vals[0], vals[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / vals[0])
+    if kind == "lognormal":
+        mu = math.log(vals[0])
+        return lambda: random.lognormvariate(mu, vals[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+_BATCH_BOT_RE = re.compile(r'bot_id "([^"]+)"')
+_BATCH_MUST_RE = re.compile(r"MUST speak: (.*)\.")
+
+
+def _kind(prompt: str) -> str:
+    if '{"replies": [' in prompt:
+        return "batched"
+    if 'JSON: {"speak_now"' in prompt:
+        return "combined"
+    if "YES or NO" in prompt:
+        return "gate"
+    if "extract new facts" in prompt.lower():
+        return "facts"
+    if prompt.startswith(("Summarize this stretch", "These are summaries")):
+        return "summary"
+    return "generation"
+
+
+def create_app(
+    latency: str = "lognormal:0.8,0.4",
+    gate_latency: Optional[str] = None,
+    yes_rate: float = 0.5,
+    script: Optional[str] = None,
+    sse: str = "auto",
+    chunk_chars: int = 12,
+) -> FastAPI:
+    app = FastAPI()
+    gen_delay = parse_latency(latency)
+    gate_delay = parse_latency(gate_latency) if gate_latency else gen_delay
+    answers = itertools.cycle(a.strip().upper() for a in script.split(",")) if script else None
+    calls: Counter = Counter()
+
+    def _gate() -> str:
+        if answers is not None:
+            return next(answers)
+        return "YES" if random.random() < yes_rate else "NO"
+
+    def _batched(prompt: str, n: int) -> str:
+        must = _BATCH_MUST_RE.search(prompt)
+        mentioned = set(re.findall(r'"([^"]+)"', must.group(1))) if must else set()
+        replies = []
+        for bot in _BATCH_BOT_RE.findall(prompt):
+            speak = bot in mentioned or _gate() == "YES"
+            replies.append({"bot_id": bot, "speak_now": speak, "content": f"Mock reply #{n} from {bot}." if speak else ""})
+        return json.dumps({"replies": replies})
+
+    def _answer(kind: str, n: int, prompt: str) -> str:
+        if kind == "gate":
+            return _gate()
+        if kind == "batched":
+            return _batched(prompt, n)
+        if kind == "combined":
+            speak = _gate() == "YES"
+            reply = {"speak_now": speak, "content": f"Mock reply #{n}. Fair point." if speak else ""}
+            return f"```json\n{json.dumps(reply)}\n```"
+        if kind == "facts":
+            return "{}"
+        if kind == "summary":
+            return f"Summary #{n}: people chatted about the usual things."
+        return f"Mock reply #{n}. Nothing impresses me, but that's a fair point."
+
+    async def completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or [{}]
+        prompt = messages[-1].get("content", "")
+        kind = _kind(prompt)
+        calls[kind] += 1
+        calls["total"] += 1
+        text = _answer(kind, calls["total"], prompt)
+        delay = gate_delay() if kind == "gate" else gen_delay()
+        stream = sse == "always" or (sse == "auto" and body.get("stream"))
+
+        if not stream:
+            await asyncio.sleep(delay)
+            return JSONResponse({"choices": [{"message": {"role": "assistant", "content": text}}]})
+
+        chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+
+        async def events():
+            # Spend a third of the latency before the first token, the rest spread over the stream
+            await asyncio.sleep(delay / 3)
+            for chunk in chunks:
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n"
+                await asyncio.sleep(delay * 2 / 3 / len(chunks))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.add_api_route("/completions", completions, methods=["POST"])
+    app.add_api_route("/hackathon/completions", completions, methods=["POST"])
+
+    @app.get("/stats")
+    async def stats():
+        return JSONResponse(dict(calls))
+
+    @app.post("/stats/reset")
+    async def reset():
+        calls.clear()
+        return JSONResponse({})
+
+    @app.head("/")
+    async def root():
+        return JSONResponse({})
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--latency", default="lognormal:0.8,0.4", help="generation latency spec")
+    ap.add_argument("--gate-latency", default="lognormal:0.3,0.5", help="YES/NO gate latency spec")
+    ap.add_argument("--yes-rate", type=float, default=0.5)
+    ap.add_argument("--script", default=None, help="cycled YES/NO answers, e.g. YES,NO,NO")
+    ap.add_argument("--sse", choices=["auto", "always", "never"], default="auto")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    app = create_app(args.latency, args.gate_latency, args.yes_rate, args.script, args.sse)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
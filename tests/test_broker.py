@@ -0,0 +1,65 @@
+import asyncio
+
+from app.broker import serve
+
+
+async def _client(path: str):
+    return await asyncio.open_unix_connection(path, limit=1 << 20)
+
+
+async def test_relay_sends_each_line_to_every_other_client(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    server = await serve(path)
+    (ra, wa), (rb, wb), (rc, wc) = [await _client(path) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    wa.write(b'{"n": 1}\n')
+    await wa.drain()
+    assert await asyncio.wait_for(rb.readline(), 1) == b'{"n": 1}\n'
+    assert await asyncio.wait_for(rc.readline(), 1) == b'{"n": 1}\n'
+    # The sender doesn't get its own line back
+    wb.write(b'{"n": 2}\n')
+    await wb.drain()
+    assert await asyncio.wait_for(ra.readline(), 1) == b'{"n": 2}\n'
+    for w in (wa, wb, wc):
+        w.close()
+    server.close()
+    await server.wait_closed()
+
+
+async def test_slow_peer_is_dropped_instead_of_buffered_without_bound(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    server = await serve(path, peer_buffer_max=256 * 1024, peer_drain_sec=0.2)
+    sender_r, sender = await _client(path)
+    fast_r, fast_w = await _client(path)
+    slow_r, slow_w = await _client(path)  # never reads
+    await asyncio.sleep(0.01)
+
+    line = b'"' + b"x" * 64 * 1024 + b'"\n'
+    received = 0
+
+    async def read_fast():
+        nonlocal received
+        while await fast_r.readline():
+            received += 1
+
+    reader = asyncio.create_task(read_fast())
+    for _ in range(200):  # ~13 MB, far more than the kernel and the peer buffer hold
+        sender.write(line)
+        await sender.drain()
+    for _ in range(100):
+        if received == 200:
+            break
+        await asyncio.sleep(0.01)
+
+    # The fast peer got everything; the slow one was cut off
+    assert received == 200
+    slow_data = b""
+    while chunk := await asyncio.wait_for(slow_r.read(1 << 20), 1):
+        slow_data += chunk
+    assert slow_data.count(b"\n") < 200
+
+    reader.cancel()
+    for w in (sender, fast_w, slow_w):
+        w.close()
+    server.close()
+    await server.wait_closed()
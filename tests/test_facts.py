@@ -0,0 +1,48 @@
+import re
+
+from app import orchestrator
+from app.config import load_default_persona, settings
+from app.schemas import LLMParams, PersonaConfig
+from app.state import RoomState
+from app.tokens import estimate_tokens
+
+
+async def test_backlog_is_split_into_budget_sized_calls(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_BUDGET_FACTS", 400)
+    prompts = []
+
+    async def fake_chat(client, messages, params, stream, priority, room_id):
+        prompt = messages[0]["content"]
+        prompts.append(prompt)
+        seen = re.findall(r"message (\d+) ", prompt)
+        return {"choices": [{"message": {"content": '{"alice": "saw %s"}' % ",".join(seen)}}]}
+
+    monkeypatch.setattr(orchestrator, "chat", fake_chat)
+    room = RoomState("r", PersonaConfig(**load_default_persona()), LLMParams())
+    batch = [room.append_message("alice", "user", f"message {i} " + "word " * 20) for i in range(20)]
+
+    facts = await orchestrator.extract_facts(None, room, batch)
+
+    assert len(prompts) > 1
+    assert all(estimate_tokens(p) <= 400 for p in prompts)
+    # Every message is read exactly once, and results are merged oldest first
+    seen = [int(n) for p in prompts for n in re.findall(r"message (\d+) ", p)]
+    assert sorted(seen) == list(range(20))
+    assert facts["alice"].startswith("saw 0,")
+
+
+async def test_single_oversized_message_is_clipped_into_one_call(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_BUDGET_FACTS", 400)
+    prompts = []
+
+    async def fake_chat(client, messages, params, stream, priority, room_id):
+        prompts.append(messages[0]["content"])
+        return {"choices": [{"message": {"content": "{}"}}]}
+
+    monkeypatch.setattr(orchestrator, "chat", fake_chat)
+    room = RoomState("r", PersonaConfig(**load_default_persona()), LLMParams())
+    batch = [room.append_message("alice", "user", "word " * 2000)]
+
+    assert await orchestrator.extract_facts(None, room, batch) == {}
+    assert len(prompts) == 1
+    assert estimate_tokens(prompts[0]) <= 400
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import llm_client
+from app.config import settings
+from app.scheduler import PRIORITY_GATING, PRIORITY_GENERATION
+from app.transport import CircuitBreaker
+
+
+@pytest.fixture(autouse=True)
+def _breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=5, reset_sec=60)
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    return breaker
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class _Trickle(httpx.AsyncByteStream):
+    """An SSE body that sends one delta every `interval` seconds, forever."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    async def __aiter__(self):
+        while True:
+            chunk = {"choices": [{"delta": {"content": "x"}}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            await asyncio.sleep(self.interval)
+
+
+async def test_slow_answer_hits_the_call_deadline(monkeypatch, _breaker):
+    monkeypatch.setattr(settings, "LLM_TIMEOUT_GATING_SEC", 0.2)
+
+    async def handler(request):
+        await asyncio.sleep(0.15)  # each attempt is under the per-read timeout...
+        return httpx.Response(503)
+
+    async with _client(handler) as client:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(TimeoutError):
+            # ...but retries would take far longer than the class deadline
+            await llm_client.chat(client, [{"role": "user", "content": "hi"}], {}, priority=PRIORITY_GATING)
+        assert loop.time() - started < 0.5
+    assert _breaker.failures >= 1
+
+
+async def test_trickling_stream_hits_the_call_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_TIMEOUT_GENERATION_SEC", 0.3)
+
+    async def handler(request):
+        return httpx.Response(200, stream=_Trickle(0.05), headers={"content-type": "text/event-stream"})
+
+    deltas = []
+    async with _client(handler) as client:
+        with pytest.raises(TimeoutError):
+            async for delta in await llm_client.chat(
+                client, [{"role": "user", "content": "hi"}], {}, stream=True, priority=PRIORITY_GENERATION,
+            ):
+                deltas.append(delta)
+    assert 2 <= len(deltas) <= 10
+
+
+async def test_stream_reports_non_upstream_errors_to_the_breaker(_breaker):
+    _breaker.state = "half_open"
+
+    async def handler(request):
+        return httpx.Response(400)
+
+    async with _client(handler) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            await llm_client._post_stream(client, {"messages": []})
+    # The upstream answered: the trial is over and the circuit closed
+    assert _breaker.state == "closed"
+    _breaker.before_call()
+
+
+async def test_cancelled_stream_frees_the_half_open_trial(_breaker):
+    _breaker.state = "half_open"
+
+    async def handler(request):
+        await asyncio.sleep(10)
+
+    async with _client(handler) as client:
+        task = asyncio.create_task(llm_client._post_stream(client, {"messages": []}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert _breaker.state == "half_open"
+    _breaker.before_call()  # a new trial is allowed at once
@@ -0,0 +1,95 @@
+import asyncio
+
+from app.mailbox import RoomMailbox
+from app.schemas import ChatMessage
+
+
+def _msg(i: int) -> ChatMessage:
+    return ChatMessage(id=str(i), room_id="r", user="alice", role="user", content=f"message {i}")
+
+
+class _Recorder:
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.delay = delay
+
+    async def __call__(self, batch):
+        self.batches.append([m.id for m in batch])
+        await asyncio.sleep(self.delay)
+
+
+async def _drain(mailbox: RoomMailbox):
+    while mailbox.busy:
+        await asyncio.sleep(0.01)
+
+
+async def test_burst_is_coalesced_into_one_batch():
+    handler = _Recorder()
+    mailbox = RoomMailbox(handler, debounce_sec=0.05, max_wait_sec=1.0, max_backlog=10)
+    for i in range(3):
+        mailbox.post(_msg(i))
+    await _drain(mailbox)
+    assert handler.batches == [["0", "1", "2"]]
+    assert mailbox.stats()["batches"] == 1
+    assert mailbox.stats()["coalesced"] == 2
+
+
+async def test_messages_during_handler_go_to_the_next_batch():
+    handler = _Recorder(delay=0.1)
+    mailbox = RoomMailbox(handler, debounce_sec=0.01, max_wait_sec=1.0, max_backlog=10)
+    mailbox.post(_msg(0))
+    await asyncio.sleep(0.05)  # handler is now running on the first batch
+    mailbox.post(_msg(1))
+    mailbox.post(_msg(2))
+    await _drain(mailbox)
+    assert handler.batches == [["0"], ["1", "2"]]
+
+
+async def test_max_wait_bounds_the_debounce():
+    handler = _Recorder()
+    mailbox = RoomMailbox(handler, debounce_sec=0.05, max_wait_sec=0.12, max_backlog=100)
+    for i in range(10):
+        mailbox.post(_msg(i))
+        await asyncio.sleep(0.03)  # never quiet for debounce_sec
+    await _drain(mailbox)
+    assert len(handler.batches) > 1
+    assert [m for batch in handler.batches for m in batch] == [str(i) for i in range(10)]
+
+
+async def test_overflow_drops_the_oldest():
+    handler = _Recorder()
+    posted = []
+    mailbox = RoomMailbox(handler, debounce_sec=0.05, max_wait_sec=1.0, max_backlog=2, on_post=posted.append)
+    for i in range(5):
+        mailbox.post(_msg(i))
+    assert mailbox.backlog == 2
+    await _drain(mailbox)
+    assert handler.batches == [["3", "4"]]
+    assert mailbox.dropped == 3
+    assert len(posted) == 5
+
+
+async def test_handler_failure_does_not_stop_the_mailbox():
+    calls = []
+
+    async def handler(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    mailbox = RoomMailbox(handler, debounce_sec=0.01, max_wait_sec=1.0, max_backlog=10)
+    mailbox.post(_msg(0))
+    await _drain(mailbox)
+    mailbox.post(_msg(1))
+    await _drain(mailbox)
+    assert calls == [1, 1]
+
+
+async def test_close_discards_pending():
+    handler = _Recorder()
+    mailbox = RoomMailbox(handler, debounce_sec=0.5, max_wait_sec=1.0, max_backlog=10)
+    mailbox.post(_msg(0))
+    mailbox.close()
+    await asyncio.sleep(0.01)
+    assert not mailbox.busy
+    assert handler.batches == []
@@ -0,0 +1,36 @@
+from app.schemas import RoomMemory
+
+
+def test_repeated_facts_keep_the_version_when_the_view_is_unchanged():
+    memory = RoomMemory()
+    memory.add_user_facts("alice", "likes tea, plays chess")
+    version = memory.version
+    memory.add_user_facts("alice", "likes tea, plays chess")
+    assert memory.facts["alice"]["likes tea"].count == 2
+    assert memory.version == version
+
+
+def test_new_fact_changes_the_view_and_the_version():
+    memory = RoomMemory()
+    memory.add_user_facts("alice", "likes tea")
+    version = memory.version
+    memory.add_user_facts("alice", "plays chess")
+    assert memory.per_user["alice"] == "plays chess; likes tea"
+    assert memory.version != version
+
+
+def test_leading_and_is_dropped_from_key_and_text():
+    memory = RoomMemory()
+    memory.add_user_facts("alice", "likes tea, and plays chess")
+    memory.add_user_facts("alice", "plays chess")
+    assert set(memory.facts["alice"]) == {"likes tea", "plays chess"}
+    assert memory.facts["alice"]["plays chess"].text == "plays chess"
+    assert memory.facts["alice"]["plays chess"].count == 2
+    assert "and" not in memory.per_user["alice"]
+
+
+def test_set_user_note_replaces_facts():
+    memory = RoomMemory()
+    memory.add_user_facts("alice", "likes tea")
+    memory.set_user_note("alice", "likes coffee")
+    assert memory.per_user == {"alice": "likes coffee"}
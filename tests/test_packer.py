@@ -0,0 +1,106 @@
+import pytest
+
+from app.config import load_default_persona, settings
+from app.packer import LINE_OVERHEAD, TokenIndex, pack
+from app.schemas import LLMParams, PersonaConfig
+from app.state import RoomState
+from app.tokens import estimate_tokens
+
+
+def _room(*sizes: int) -> RoomState:
+    """A room whose i-th message is sizes[i] one-token words."""
+    room = RoomState("r", PersonaConfig(**load_default_persona()), LLMParams())
+    for i, n in enumerate(sizes):
+        room.append_message("u", "user", " ".join(["word"] * n))
+    return room
+
+
+def _cost(n: int) -> int:
+    # "u: word word ..." plus the line overhead
+    return estimate_tokens("u:") + n + LINE_OVERHEAD
+
+
+def test_keeps_the_newest_messages_that_fit():
+    room = _room(10, 10, 10, 10)
+    packed = pack("gating", [], room.history, budget=3 * _cost(10), index=room.token_index())
+    assert [m.id for m, _ in packed.items] == [m.id for m in room.history[1:]]
+    assert packed.dropped == 1
+    assert packed.tokens == 3 * _cost(10) <= packed.budget
+
+
+def test_fixed_parts_count_against_the_budget():
+    room = _room(10, 10, 10)
+    fixed = " ".join(["word"] * _cost(10))
+    packed = pack("gating", [fixed], room.history, budget=3 * _cost(10), index=room.token_index())
+    assert len(packed.items) == 2
+    assert packed.fixed_tokens == _cost(10)
+    assert packed.tokens <= packed.budget
+
+
+def test_floor_leaves_out_summarized_history():
+    room = _room(1, 1, 1, 1)
+    packed = pack("gating", [], room.history, budget=1000, floor=3, index=room.token_index())
+    assert [m.id for m, _ in packed.items] == [room.history[3].id]
+    assert packed.dropped == 0
+
+
+def test_oversized_message_is_clipped(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_MAX_MESSAGE_TOKENS", 20)
+    room = _room(5, 200, 5)
+    packed = pack("generation", [], room.history, budget=1000, index=room.token_index())
+    assert len(packed.items) == 3
+    assert packed.truncated == 1
+    assert estimate_tokens(packed.items[1][1]) <= 20 + estimate_tokens("u:")
+    assert packed.tokens <= packed.budget
+
+
+def test_newest_message_is_cut_rather_than_dropped():
+    room = _room(10, 100)
+    packed = pack("gating", [], room.history, budget=30, index=room.token_index())
+    assert [m.id for m, _ in packed.items] == [room.history[1].id]
+    assert packed.truncated == 1
+    assert packed.dropped == 1
+    assert packed.tokens <= 30
+
+
+def test_nothing_is_packed_when_fixed_parts_fill_the_budget():
+    room = _room(10)
+    packed = pack("gating", [" ".join(["word"] * 50)], room.history, budget=40, index=room.token_index())
+    assert packed.items == []
+    assert packed.dropped == 1
+
+
+def test_custom_format_and_overhead():
+    room = _room(3, 3)
+    room.append_message("bot", "assistant", "hi there")
+    packed = pack(
+        "generation", [], room.history, fmt=lambda m, content: content, overhead=4, budget=1000,
+        index=room.token_index(),
+    )
+    assert [text for _, text in packed.items] == ["word word word", "word word word", "hi there"]
+
+
+@pytest.mark.parametrize("budget", [0, 7, 20, 55, 400])
+def test_plain_list_packs_like_the_room_index(budget):
+    room = _room(3, 12, 7, 30, 1, 9)
+    with_index = pack("facts", [], room.history, budget=budget, index=room.token_index())
+    plain = pack("facts", [], list(room.history), budget=budget)
+    assert with_index.items == plain.items
+    assert with_index.tokens == plain.tokens
+
+
+def test_index_is_rebuilt_after_history_is_edited():
+    room = _room(1, 2, 3)
+    room.history.pop(0)
+    index = room.token_index()
+    assert len(index) == 2
+    assert index.prefix == TokenIndex(room.history).prefix
+
+
+def test_head_end_takes_the_oldest_messages_that_fit():
+    room = _room(10, 10, 10, 10)
+    index = room.token_index()
+    assert index.head_end(1, 4, 2 * _cost(10), LINE_OVERHEAD) == 3
+    assert index.head_end(1, 4, 2 * _cost(10) - 1, LINE_OVERHEAD) == 2
+    assert index.head_end(0, 4, 1000, LINE_OVERHEAD) == 4
+    assert index.head_end(2, 4, 0, LINE_OVERHEAD) == 2
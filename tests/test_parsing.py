@@ -0,0 +1,72 @@
+import pytest
+
+from app.orchestrator import parse_batched, parse_structured
+
+
+@pytest.mark.parametrize("raw", [
+    '{"speak_now": true, "content": "hi"}',
+    '```json\n{"speak_now": true, "content": "hi"}\n```',
+    'Sure! Here is my answer: {"speak_now": true, "content": "hi"} Hope that helps.',
+    {"speak_now": True, "content": "hi"},
+])
+def test_structured_is_found_in_fences_and_prose(raw):
+    parsed = parse_structured(raw)
+    assert parsed is not None
+    assert parsed.speak_now and parsed.content == "hi"
+
+
+def test_structured_forgives_the_usual_slips():
+    parsed = parse_structured('{"content": "hello", "address": "alice", "moderation_flags": ""}')
+    assert parsed.speak_now is True
+    assert parsed.address == ["alice"]
+    assert parsed.moderation_flags == []
+    silent = parse_structured('{"content": null}')
+    assert silent.speak_now is False and silent.content == ""
+
+
+@pytest.mark.parametrize("raw", [
+    "",
+    "I think we should all calm down.",
+    '{"speak_now": true, "content": "unterminated',
+    "[1, 2, 3]",
+    '{"speak_now": "maybe later", "content": "x"}',
+    '{"speak_now": true, "address": 5}',
+    None,
+    42,
+])
+def test_structured_rejects_malformed_output(raw):
+    assert parse_structured(raw) is None
+
+
+def test_batched_validates_each_entry():
+    parsed = parse_batched("""```json
+{"replies": [
+  {"bot_id": "gooner", "speak_now": true, "content": "yo"},
+  {"bot_id": "zen", "content": null},
+  {"bot_id": "mama", "speak_now": "perhaps", "content": "dear"},
+  {"speak_now": true, "content": "no bot id"},
+  "not an entry",
+  {"bot_id": "professor", "content": "Indeed."}
+]}
+```""")
+    assert [(r.bot_id, r.speak_now, r.content) for r in parsed.replies] == [
+        ("gooner", True, "yo"),
+        ("zen", False, ""),
+        ("professor", True, "Indeed."),
+    ]
+    assert parsed.invalid == ["mama"]
+
+
+@pytest.mark.parametrize("raw", [
+    "nobody should answer",
+    '{"replies": "gooner: yo"}',
+    '{"answers": []}',
+    '{"replies": [',
+])
+def test_batched_without_a_replies_list_is_unparsed(raw):
+    assert parse_batched(raw) is None
+
+
+def test_batched_empty_replies_means_everyone_stays_quiet():
+    parsed = parse_batched('{"replies": []}')
+    assert parsed.replies == [] and parsed.invalid == []
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.preemption import PREEMPTION_STATS, RoundTracker, enter_stage, mark_sent, spawn
+
+
+@pytest.fixture(autouse=True)
+def _stale_after_two(monkeypatch):
+    monkeypatch.setattr(settings, "BOT_STALE_AFTER_MESSAGES", 2)
+    monkeypatch.setattr(settings, "BOT_STALE_SPARE_MENTIONS", True)
+
+
+async def _bot(release: asyncio.Event, send: bool):
+    """A bot job that enters generation, optionally gets its call out, then waits for the reply."""
+    enter_stage("generation")
+    if send:
+        mark_sent()
+    await release.wait()
+    enter_stage("generation")  # a second call, e.g. after a YES gate
+    return "reply"
+
+
+def _start(tracker: RoundTracker, bots, spared=()):
+    rnd = tracker.begin(tracker.human_seq, spared=spared)
+    release = asyncio.Event()
+    tasks = {}
+    for bot_id, send in bots.items():
+        task = tasks[bot_id] = asyncio.create_task(rnd.track(bot_id, _bot(release, send), "queued"))
+        rnd.started(bot_id, task)
+    return rnd, release, tasks
+
+
+async def _outcome(task: asyncio.Task):
+    try:
+        return await task
+    except asyncio.CancelledError:
+        return "cancelled"
+
+
+async def test_unsent_calls_are_cancelled_once_the_round_is_stale():
+    tracker = RoundTracker("r")
+    rnd, release, tasks = _start(tracker, {"sent": True, "queued": False})
+    await asyncio.sleep(0)
+    tracker.on_human_message()
+    assert not rnd.preempted  # one newer message is not enough
+    tracker.on_human_message()
+    assert rnd.is_preempted("queued")
+    release.set()
+    assert await _outcome(tasks["queued"]) == "cancelled"
+    # The sent call is let finish, but the job stops before its next call
+    assert await _outcome(tasks["sent"]) == "cancelled"
+    assert rnd.is_preempted("sent")
+    tracker.end(rnd)
+
+
+async def test_mentioned_bots_are_spared():
+    tracker = RoundTracker("r")
+    rnd, release, tasks = _start(tracker, {"gooner": False, "zen": False}, spared=["zen"])
+    await asyncio.sleep(0)
+    tracker.on_human_message()
+    tracker.on_human_message()
+    release.set()
+    assert await _outcome(tasks["gooner"]) == "cancelled"
+    assert await _outcome(tasks["zen"]) == "reply"
+    assert not rnd.is_preempted("zen")
+    tracker.end(rnd)
+
+
+async def test_mentions_are_not_spared_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "BOT_STALE_SPARE_MENTIONS", False)
+    tracker = RoundTracker("r")
+    rnd, release, tasks = _start(tracker, {"zen": False}, spared=["zen"])
+    await asyncio.sleep(0)
+    tracker.on_human_message()
+    tracker.on_human_message()
+    assert await _outcome(tasks["zen"]) == "cancelled"
+    tracker.end(rnd)
+
+
+async def test_round_after_a_preempted_one_runs_to_completion():
+    tracker = RoundTracker("r")
+    rnd, _, tasks = _start(tracker, {"gooner": False})
+    await asyncio.sleep(0)
+    tracker.on_human_message()
+    tracker.on_human_message()
+    await _outcome(tasks["gooner"])
+    tracker.end(rnd)
+
+    rnd, release, tasks = _start(tracker, {"gooner": False})
+    assert rnd.protected
+    await asyncio.sleep(0)
+    for _ in range(5):
+        tracker.on_human_message()
+    release.set()
+    assert await _outcome(tasks["gooner"]) == "reply"
+    tracker.end(rnd)
+
+
+async def test_unstarted_job_is_marked_preempted():
+    tracker = RoundTracker("r")
+    rnd = tracker.begin(tracker.human_seq)
+    job = rnd.track("gooner", _bot(asyncio.Event(), False))
+    tracker.on_human_message()
+    tracker.on_human_message()
+    assert rnd.is_preempted("gooner")
+    rnd.close_unstarted("gooner", job)
+    tracker.end(rnd)
+
+
+async def test_finished_round_is_never_preempted():
+    tracker = RoundTracker("r")
+    rnd, release, tasks = _start(tracker, {"gooner": False})
+    release.set()
+    assert await _outcome(tasks["gooner"]) == "reply"
+    tracker.end(rnd)
+    tracker.on_human_message()
+    tracker.on_human_message()
+    assert not rnd.preempted
+
+
+async def test_speculative_generation_has_its_own_job_state():
+    tracker = RoundTracker("r")
+    rnd = tracker.begin(tracker.human_seq)
+    gate_sent = asyncio.Event()
+    gate_answer = asyncio.Event()
+    generation_queued = asyncio.Event()
+
+    async def generation():
+        enter_stage("generation")
+        generation_queued.set()
+        await asyncio.sleep(10)  # still waiting for a scheduler slot: never sent
+        return "reply"
+
+    async def speculative():
+        enter_stage("speculative")
+        task = spawn(generation(), "generation")
+        try:
+            enter_stage("gating")
+            mark_sent()  # the gate goes out
+            gate_sent.set()
+            await gate_answer.wait()
+            return await task
+        finally:
+            task.cancel()
+
+    job = asyncio.create_task(rnd.track("gooner", speculative()))
+    rnd.started("gooner", job)
+    await gate_sent.wait()
+    await generation_queued.wait()
+    assert rnd.jobs["gooner"].sent
+    assert not rnd.jobs["gooner"].children[0].sent
+
+    saved = PREEMPTION_STATS["calls_saved"]
+    tracker.on_human_message()
+    tracker.on_human_message()
+    # Only the queued generation is cancelled; the gate already sent is let finish
+    assert rnd.is_preempted("gooner")
+    assert PREEMPTION_STATS["calls_saved"] == saved + 1
+    assert not job.done()
+    gate_answer.set()
+    assert await _outcome(job) == "cancelled"
+    tracker.end(rnd)
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.scheduler import (
+    PRIORITY_FACTS,
+    PRIORITY_GATING,
+    PRIORITY_GENERATION,
+    PRIORITY_MENTION,
+    LLMScheduler,
+)
+
+
+async def _served_order(scheduler: LLMScheduler, requests):
+    """Queue `requests` (label, priority, room) behind a held slot and return the order they are served in."""
+    await scheduler.acquire()
+    order = []
+
+    async def wait(label, priority, room_id):
+        await scheduler.acquire(priority, room_id)
+        order.append(label)
+
+    tasks = []
+    for request in requests:
+        tasks.append(asyncio.create_task(wait(*request)))
+        await asyncio.sleep(0)  # enqueue in the given order
+    assert scheduler.queue_depth == len(requests)
+    for _ in requests:
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+async def test_priority_classes_are_served_in_order():
+    order = await _served_order(LLMScheduler(1), [
+        ("facts", PRIORITY_FACTS, "r"),
+        ("gating", PRIORITY_GATING, "r"),
+        ("generation", PRIORITY_GENERATION, "r"),
+        ("mention", PRIORITY_MENTION, "r"),
+    ])
+    assert order == ["mention", "generation", "gating", "facts"]
+
+
+async def test_rooms_share_a_class_fairly():
+    busy = [(f"a{i}", PRIORITY_GATING, "a") for i in range(4)]
+    quiet = [(f"b{i}", PRIORITY_GATING, "b") for i in range(2)]
+    order = await _served_order(LLMScheduler(1), busy + quiet)
+    # The quiet room doesn't wait behind the busy room's whole backlog
+    assert order == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+async def test_weight_gives_a_room_a_larger_share():
+    scheduler = LLMScheduler(1)
+    scheduler.set_weight("a", 2.0)
+    busy = [(f"a{i}", PRIORITY_GATING, "a") for i in range(4)]
+    quiet = [(f"b{i}", PRIORITY_GATING, "b") for i in range(2)]
+    order = await _served_order(scheduler, busy + quiet)
+    assert order == ["a0", "b0", "a1", "a2", "b1", "a3"]
+
+
+async def test_concurrency_is_capped():
+    scheduler = LLMScheduler(2)
+    peak = 0
+    running = 0
+
+    async def call():
+        nonlocal peak, running
+        async with scheduler.slot(PRIORITY_GENERATION, "r"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+    assert scheduler.in_flight == 0
+    assert scheduler.stats()["classes"]["generation"]["dispatched"] == 6
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = LLMScheduler(1)
+    await scheduler.acquire()
+    waiter = asyncio.create_task(scheduler.acquire(PRIORITY_GATING, "r"))
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth == 1
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.queue_depth == 0
+    assert scheduler.stats()["rooms_queued"] == {}
+    scheduler.release()
+    assert scheduler.in_flight == 0
@@ -0,0 +1,31 @@
+from app.config import load_default_persona, settings
+from app.schemas import LLMParams, PersonaConfig
+from app.state import RoomState
+from app.summarizer import Summarizer
+from app.tokens import estimate_tokens
+
+
+def _room(*sizes: int) -> RoomState:
+    room = RoomState("r", PersonaConfig(**load_default_persona()), LLMParams())
+    for n in sizes:
+        room.append_message("u", "user", " ".join(["word"] * n))
+    return room
+
+
+async def test_chunk_is_shortened_to_the_summary_budget(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_BUDGET_SUMMARY", 300)
+    prompts = []
+
+    async def fake_chat(client, messages, params, stream, priority, room_id):
+        prompts.append(messages[0]["content"])
+        return {"choices": [{"message": {"content": "summary"}}]}
+
+    monkeypatch.setattr("app.summarizer.chat", fake_chat)
+    room = _room(*([150] * 8))
+    summarizer = Summarizer(room, None, live_messages=2, chunk_messages=4, fanout=4)
+    await summarizer._run()
+    # Two 150-word messages don't fit: each chunk shrinks to one, until a full chunk no longer waits
+    assert len(prompts) == 3
+    assert all(estimate_tokens(p) <= 300 for p in prompts)
+    assert room.summarized_upto == 3
+    assert summarizer.failures == 0
@@ -0,0 +1,169 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import llm_client, transport
+from app.config import settings
+from app.scheduler import LLMScheduler, PRIORITY_GATING
+from app.transport import CircuitBreaker, CircuitOpenError, HedgePolicy
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(transport.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_sec=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()  # a success resets the streak
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["times_opened"] == 1
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_sec=10)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 9.9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 0.2
+    breaker.before_call()  # the trial
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # a second call while the trial is in flight
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_sec=10)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    clock.now += 5
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_trial_that_never_reports_expires(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_sec=10)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()  # trial, then the caller vanishes
+    clock.now += 10
+    breaker.before_call()  # a new trial once the old one expired
+    assert breaker.state == "half_open"
+
+
+def test_abandoned_trial_frees_the_slot_at_once(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_sec=10)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.abandon()
+    breaker.before_call()
+    assert breaker.state == "half_open"
+
+
+def test_hedge_budget_is_a_token_bucket(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_BURST", 2.0)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_FRACTION", 0.25)
+    policy = HedgePolicy()
+    assert policy.try_hedge() and policy.try_hedge()
+    assert not policy.try_hedge()  # burst spent
+    assert policy.skipped_budget == 1
+    for _ in range(3):
+        policy.on_primary()
+    assert not policy.try_hedge()  # 0.75 tokens earned
+    policy.on_primary()
+    assert policy.try_hedge()
+    for _ in range(100):
+        policy.on_primary()
+    assert policy.tokens == 2.0  # capped at the burst
+
+
+def test_hedge_deadline_adapts_to_recent_latencies(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DEFAULT_SEC", 1.5)
+    monkeypatch.setattr(settings, "LLM_HEDGE_PERCENTILE", 0.9)
+    policy = HedgePolicy()
+    assert policy.deadline() == 1.5
+    for i in range(100):
+        policy.record(i / 100)
+    assert policy.deadline() == pytest.approx(0.9)
+
+
+@pytest.fixture
+def hedged(monkeypatch):
+    """_hedged_post over a one-slot scheduler and an upstream taking `latency` seconds per call."""
+    monkeypatch.setattr(settings, "LLM_HEDGE_DEFAULT_SEC", 0.1)
+    monkeypatch.setattr(settings, "LLM_HEDGE_BURST", 5.0)
+    state = SimpleNamespace(latency=0.05, calls=[], scheduler=LLMScheduler(2), policy=HedgePolicy())
+    monkeypatch.setattr(llm_client, "scheduler", state.scheduler)
+    monkeypatch.setattr(llm_client, "hedging", state.policy)
+
+    async def fake_post(client, payload, stream=False, priority=None):
+        state.calls.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(state.latency)
+        return "answer"
+
+    monkeypatch.setattr(llm_client, "_post", fake_post)
+    return state
+
+
+async def test_hedge_deadline_starts_once_the_primary_is_sent(hedged):
+    # Both slots busy for 0.3s: the primary waits in the local queue longer than the deadline
+    await hedged.scheduler.acquire()
+    await hedged.scheduler.acquire()
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.3, hedged.scheduler.release)
+    loop.call_later(0.3, hedged.scheduler.release)
+    assert await llm_client._hedged_post(None, {}, PRIORITY_GATING, "r") == "answer"
+    assert len(hedged.calls) == 1  # no duplicate for time spent queued
+    assert hedged.policy.hedges == 0
+    # The latency learned is the upstream's, not the queueing delay
+    assert hedged.policy.latencies[0] < 0.2
+
+
+async def test_slow_primary_is_hedged_after_the_deadline(hedged):
+    hedged.latency = 0.3
+    assert await llm_client._hedged_post(None, {}, PRIORITY_GATING, "r") == "answer"
+    assert len(hedged.calls) == 2
+    assert hedged.calls[1] - hedged.calls[0] == pytest.approx(0.1, abs=0.05)
+    assert hedged.policy.hedges == 1
+
+
+async def test_no_hedge_without_budget(hedged, monkeypatch):
+    hedged.latency = 0.2
+    hedged.policy.tokens = 0.0
+    assert await llm_client._hedged_post(None, {}, PRIORITY_GATING, "r") == "answer"
+    assert len(hedged.calls) == 1
+    assert hedged.policy.skipped_budget == 1
@@ -0,0 +1,138 @@
+import asyncio
+
+from app.broker import Broker
+from app.config import settings
+from app.websocket import ConnectionManager
+
+
+class _Socket:
+    """Stands in for a starlette WebSocket; `gate` holds sends back to simulate a slow client."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        await self.gate.wait()
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = code
+
+
+def _manager(**kwargs) -> ConnectionManager:
+    return ConnectionManager(broker=Broker(), **kwargs)
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_frames_reach_every_socket_in_order():
+    manager = _manager(queue_size=8)
+    a, b = _Socket(), _Socket()
+    await manager.connect("r", a)
+    await manager.connect("r", b)
+    for i in range(3):
+        manager.deliver("r", {"type": "chat", "n": i})
+    await _settle()
+    assert len(a.sent) == len(b.sent) == 3
+    assert a.sent == b.sent
+    await manager.stop()
+
+
+async def test_slow_consumer_drops_typing_then_is_disconnected():
+    manager = _manager(queue_size=2, overflow_policy="drop_typing")
+    slow, fast = _Socket(), _Socket()
+    slow.gate.clear()
+    await manager.connect("r", slow)
+    await manager.connect("r", fast)
+
+    async def deliver(message):
+        manager.deliver("r", message)
+        await _settle()  # the fast socket keeps up
+
+    await deliver({"type": "chat", "n": 0})  # taken by the slow writer, stuck in send_text
+    await deliver({"type": "typing"})
+    await deliver({"type": "chat", "n": 1})
+    conn = manager.rooms["r"][slow]
+    assert len(conn.queue) == 2
+    await deliver({"type": "chat", "n": 2})  # full: the queued typing frame makes room
+    assert conn.dropped == 1 and len(conn.queue) == 2
+    await deliver({"type": "typing"})  # full, droppable: dropped
+    assert conn.dropped == 2
+    await deliver({"type": "chat", "n": 3})  # full, nothing left to drop: reaped
+    assert slow not in manager.rooms["r"]
+    assert slow.closed == 1013
+    assert manager.reaped["overflow"] == 1
+    # The slow socket never held up the fast one
+    assert len(fast.sent) == 6
+    assert not manager._reaps
+    await manager.stop()
+
+
+async def test_disconnect_policy_reaps_on_first_overflow():
+    manager = _manager(queue_size=1, overflow_policy="disconnect")
+    slow = _Socket()
+    slow.gate.clear()
+    await manager.connect("r", slow)
+    await _settle()
+    manager.deliver("r", {"type": "chat", "n": 0})  # taken by the writer, stuck in send_text
+    await _settle()
+    manager.deliver("r", {"type": "chat", "n": 1})  # queued
+    manager.deliver("r", {"type": "typing"})  # overflow: even a droppable frame disconnects
+    await _settle()
+    assert "r" not in manager.rooms
+    assert manager.reaped["overflow"] == 1
+    await manager.stop()
+
+
+async def test_idle_socket_is_reaped_and_live_one_is_pinged(monkeypatch):
+    monkeypatch.setattr(settings, "WS_PING_INTERVAL_SEC", 0.02)
+    monkeypatch.setattr(settings, "WS_IDLE_TIMEOUT_SEC", 0.1)
+    manager = _manager(queue_size=8)
+    idle, live = _Socket(), _Socket()
+    await manager.connect("r", idle)
+    await manager.connect("r", live)
+    await manager.start()
+    for _ in range(10):
+        await asyncio.sleep(0.02)
+        manager.touch("r", live)  # any frame from the client, e.g. a pong
+    assert idle not in manager.rooms["r"]
+    assert idle.closed == 1001
+    assert manager.reaped["idle"] == 1
+    assert live in manager.rooms["r"]
+    assert any('"ping"' in frame for frame in live.sent)
+    await manager.stop()
+
+
+async def test_disconnect_cancels_the_writer():
+    manager = _manager(queue_size=8)
+    ws = _Socket()
+    await manager.connect("r", ws)
+    writer = manager.rooms["r"][ws].writer
+    await manager.disconnect("r", ws)
+    await _settle()
+    assert writer.cancelled()
+    assert "r" not in manager.rooms
+
+
+async def test_send_error_reaps_the_socket():
+    manager = _manager(queue_size=8)
+    ws = _Socket()
+
+    async def broken(data):
+        raise RuntimeError("connection reset")
+
+    ws.send_text = broken
+    await manager.connect("r", ws)
+    manager.deliver("r", {"type": "chat"})
+    await _settle()
+    assert "r" not in manager.rooms
+    assert manager.reaped["send_error"] == 1
@@ -21,6 +21,11 @@ export default function useWebSocket(roomId, userName, onMessage) {
     ws.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
+        if (data.type === 'ping') {
+          // Server heartbeat: answer so the socket isn't reaped as idle
+          ws.send(JSON.stringify({ type: 'pong' }));
+          return;
+        }
         console.log('Received message:', data);
         onMessage(data);
       } catch (e) {
@@ -31,6 +31,40 @@ export default function ChatRoom() {
         content: data.content,
         timestamp: data.ts || Date.now()
       }]);
+    } else if (data.type === 'chat.delta') {
+      // Streaming reply: grow the bubble keyed by stream_id
+      setMessages(prev => {
+        const idx = prev.findIndex(m => m.id === data.stream_id);
+        if (idx === -1) {
+          return [...prev, {
+            id: data.stream_id,
+            user: data.user,
+            content: data.delta,
+            timestamp: Date.now()
+          }];
+        }
+        const next = [...prev];
+        next[idx] = { ...next[idx], content: next[idx].content + data.delta };
+        return next;
+      });
+    } else if (data.type === 'chat.done' && data.aborted) {
+      // The reply was dropped after it started streaming: take the partial bubble down
+      setMessages(prev => prev.filter(m => m.id !== data.stream_id));
+    } else if (data.type === 'chat.done') {
+      // Final (cleaned-up) text replaces the streamed partial
+      setMessages(prev => {
+        const final = {
+          id: data.stream_id,
+          user: data.user,
+          content: data.content,
+          timestamp: data.ts || Date.now()
+        };
+        const idx = prev.findIndex(m => m.id === data.stream_id);
+        if (idx === -1) return [...prev, final];
+        const next = [...prev];
+        next[idx] = final;
+        return next;
+      });
     } else if (data.type === 'room_state') {
       // Initial room state with active bots
       console.log('Received room state:', data);
@@ -100,11 +100,37 @@
     
     messagesArea.appendChild(msgDiv);
     scrollToBottom();
+    return msgDiv;
   };
 
+  // stream_id -> bubble element of a reply that is still streaming
+  const streams = {};
+
   const handleMessage = (obj) => {
-    if (obj.type === 'chat') {
+    if (obj.type === 'ping') {
+      // Server heartbeat: answer so the socket isn't reaped as idle
+      send({type: 'pong'});
+    } else if (obj.type === 'chat') {
       appendChatMessage(obj.user, obj.content);
+    } else if (obj.type === 'chat.delta') {
+      if (!streams[obj.stream_id]) {
+        streams[obj.stream_id] = appendChatMessage(obj.user, '').querySelector('.message-bubble');
+      }
+      streams[obj.stream_id].textContent += obj.delta;
+      scrollToBottom();
+    } else if (obj.type === 'chat.done' && obj.aborted) {
+      // The reply was dropped after it started streaming: take the partial bubble down
+      if (streams[obj.stream_id]) {
+        streams[obj.stream_id].closest('.message').remove();
+        delete streams[obj.stream_id];
+      }
+    } else if (obj.type === 'chat.done') {
+      if (streams[obj.stream_id]) {
+        streams[obj.stream_id].textContent = obj.content;
+        delete streams[obj.stream_id];
+      } else {
+        appendChatMessage(obj.user, obj.content);
+      }
     } else if (obj.type === 'system') {
       const event = obj.event || '';
       if (event === 'debate.start') {